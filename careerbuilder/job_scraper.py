@@ -8,22 +8,36 @@ storage that takes place.
 Usage: 
 
     python job_scraper.py <job title> <job location>
+    python job_scraper.py --batch <searches CSV>
+
+Postings that can't be fetched (after retrying) are recorded in the 
+`dead_letters` database, and can be re-crawled on their own with: 
+
+    python job_scraper.py --retry-failed
 """
 
 import sys
 import os
 wd = os.path.abspath('.')
 sys.path.append(wd + '/../')
-import time
-import random
+import math
 import datetime
 import pytz
-from selenium.webdriver.common.keys import Keys
-from general_utilities.navigation_utilities import issue_driver_query
-from general_utilities.parsing_utilities import parse_num
-from general_utilities.storage_utilities import store_in_mongo
+from selenium.webdriver.common.by import By
+from general_utilities.query_utilities import normalize_href, set_query_param
+from general_utilities.navigation_utilities import (issue_driver_query, 
+        run_browser_pages, wait_for_element, wait_for_network_idle, jitter, 
+        query_page)
+from general_utilities.batch_utilities import (read_searches, 
+        recrawl_dead_letters)
+from general_utilities.parsing_utilities import parse_num, extract_visible_text
+from general_utilities.storage_utilities import (store_in_mongo, 
+        find_stored_keys, record_dead_letter)
 from general_utilities.threading_utilities import HrefQueryThread
 
+# Number of jobs CareerBuilder shows on each page of results. 
+JOBS_PER_PAGE = 25
+
 def scrape_job_page(driver, job_title, job_location): 
     """Scrape a page of jobs from CareerBuilder.
 
@@ -44,29 +58,48 @@ def scrape_job_page(driver, job_title, job_location):
             'search_location': job_location, \
             'search_date': current_date, 'job_site': 'careerbuilder'}
 
+    posting_keys = [normalize_href(href) if href else '' for href in hrefs]
+    # Only fetch the postings that haven't been stored already (e.g. by the 
+    # previous day's run of an overlapping search). 
+    stored_keys = find_stored_keys(posting_keys, 'job_postings', 
+            'careerbuilder', 'posting_key')
+
     thread_lst = []
-    for href in hrefs:  
-        try: 
-            thread = HrefQueryThread(href.get_attribute('href'))
-        except: 
-            print('Exception in href thread builder')
-            thread = HrefQueryThread('')
+    for href, posting_key in zip(hrefs, posting_keys): 
+        if posting_key and posting_key in stored_keys: 
+            thread_lst.append(None)
+            continue
+        stored_keys.add(posting_key)
+        thread = HrefQueryThread(href)
         thread_lst.append(thread)
         thread.start()
     mongo_update_lst = []
-    for title, location, company, date, thread, idx in \
-            zip(titles, locations, companies, dates, thread_lst, range(len(hrefs))): 
+    for title, location, company, date, thread, posting_key, idx in \
+            zip(titles, locations, companies, dates, thread_lst, posting_keys, 
+                    range(len(hrefs))): 
+        if thread is None: 
+            continue
         try: 
             mongo_dct = gen_output(json_dct.copy(), title, location, 
                     company, date, thread, idx)
-            mongo_update_lst.append(mongo_dct)
+            mongo_dct['posting_key'] = posting_key
         except: 
             print('Missed element in careerbuilder!')
+            continue
+
+        if thread.error is not None: 
+            # Keep track of the posting, so it can be re-crawled later on. 
+            del mongo_dct['posting_txt']
+            record_dead_letter(thread.error, 'careerbuilder', document=mongo_dct)
+        else: 
+            mongo_update_lst.append(mongo_dct)
 
     store_in_mongo(mongo_update_lst, 'job_postings', 'careerbuilder')
 
 def query_for_data(driver): 
     """Grab all the relevant data on a jobs page. 
+
+    Everything is grabbed from the browser in one go (see `query_page`). 
     
     Args: 
     ----
@@ -74,31 +107,33 @@ def query_for_data(driver):
 
     Return: 
     ------
-        job_titles: list
-        job_locations: list 
-        posting_companies: list 
-        dates: list
-        hrefs: list 
+        job_titles: list of strings
+        job_locations: list of strings
+        posting_companies: list of strings
+        dates: list of strings
+        hrefs: list of strings
     """
 
-    job_titles = driver.find_elements_by_class_name('job-title')
-    job_texts = driver.find_elements_by_class_name('job-text')
+    selectors = {'job_titles': '.job-title', 'job_texts': '.job-text', 
+            'dates': 'div .time-posted', 'hrefs': 'h2 a'}
+    page_data = query_page(driver, selectors, attributes={'hrefs': 'href'})
+
+    job_texts = page_data['job_texts']
     posting_companies = job_texts[2::3]
     job_locations = job_texts[::3] 
-    dates = driver.find_elements_by_css_selector('div .time-posted')
-    hrefs = driver.find_elements_by_xpath("//h2//a")
         
-    return job_titles, job_locations, posting_companies, dates, hrefs 
+    return (page_data['job_titles'], job_locations, posting_companies, 
+            page_data['dates'], page_data['hrefs'])
 
 def gen_output(json_dct, title, location, company, date, thread, idx): 
     """Format the output dictionary that will end up going into Mongo. 
 
     Args: 
         json_dct: dict
-        title: Selenium WebElement 
-        location: Selenium WebElement 
-        company: Selenium WebElement
-        date: Selenium WebElement
+        title: str
+        location: str
+        company: str
+        date: str
         thread: RequestThreadInfo object
 
     Return:
@@ -109,64 +144,93 @@ def gen_output(json_dct, title, location, company, date, thread, idx):
     # Need to make sure that the thread is done first. 
     thread.join()
 
-    json_dct['job_title'] = title.text
-    json_dct['location'] = location.text
-    json_dct['company'] = company.text
-    json_dct['date'] = date.text
+    json_dct['job_title'] = title
+    json_dct['location'] = location
+    json_dct['company'] = company
+    json_dct['date'] = date
 
     json_dct['posting_txt'] = thread.posting_txt
 
     return json_dct
     
-def check_if_next(driver):
-    """Check if there is a next page of job results to grab. 
+def gen_page_tasks(driver, job_title, job_location): 
+    """Query the search, and generate a task for each page of its results. 
 
-    Grab the clickable job links on the bottom of the page, and check if one reads
-    'Next'. If so, click it and return True. Otherwise, return False. 
+    Find the number of jobs for the search (storing it in Mongo), and use it to 
+    figure out the URL of each page of results, so that the pages can be loaded 
+    directly (and in parallel), rather than by clicking 'Next' on each one. 
 
     Args: 
     ----
         driver: Selenium webdriver
+            Holds the browser to run the search in (e.g. one from a 
+            `BrowserPool`). 
+        job_title: str
+        job_location: str
 
-    Return: bool 
+    Return: 
+    ------
+        page_tasks: list of tuples
+            Holds the arguments to pass to `scrape_page` (after the browser) 
+            for each page. 
     """
 
-    # If the following class name is not found, then the next button doesn't exist
-    # and it will fail. The except block will then catch it and return a False. 
-    try: 
-        last_link = driver.find_element_by_xpath("//a[@aria-label='Next Page']")
-        last_link.send_keys(Keys.ENTER)
-        return True
-    except: 
-        return False
-
-if __name__ == '__main__':
-    try: 
-        job_title = sys.argv[1]
-        job_location = sys.argv[2]
-    except IndexError: 
-        raise Exception('Program needs a job title and job location inputted!')
-    
     # Navigate to the base URL and issue the original search query. 
     base_URL = 'http://www.careerbuilder.com/'
     query_params = (('keywords', job_title), ('location', job_location))
-    driver = issue_driver_query(base_URL, query_params)
+    issue_driver_query(base_URL, query_params, driver=driver)
 
     # Grab num. jobs
     try: 
-        num_jobs_txt = driver.find_element_by_css_selector('div .count').text
+        num_jobs_txt = wait_for_element(driver, 
+                (By.CSS_SELECTOR, 'div .count')).text
         num_jobs = int(parse_num(num_jobs_txt, 0)) 
     except: 
         print('No jobs for search {} in {}'.format(job_title, job_location))
-        sys.exit(0)
+        return []
 
     current_date = str(datetime.datetime.now(pytz.timezone('US/Mountain')))
     storage_dct = {'job_site': 'careerbuilder', 'num_jobs': num_jobs, 
             'date': current_date, 'title': job_title, 'location': job_location}
     store_in_mongo([storage_dct], 'job_numbers', 'careerbuilder')
 
-    is_next = True
-    while is_next: 
-        jobs = scrape_job_page(driver, job_title, job_location)
-        is_next = check_if_next(driver)
-    driver.close()
+    # The search box sends us to the URL of the first page of results, which the 
+    # rest of the pages only differ from by their page number. 
+    results_URL = driver.current_url
+    num_pages = math.ceil(num_jobs / JOBS_PER_PAGE)
+    return [(set_query_param(results_URL, 'page_number', page_num), job_title, 
+        job_location) for page_num in range(1, num_pages + 1)]
+
+def scrape_page(driver, page_URL, job_title, job_location): 
+    """Load a page of job results in the browser, and scrape it. 
+
+    Args: 
+    ----
+        driver: Selenium webdriver
+        page_URL: str
+        job_title: str
+        job_location: str
+    """
+
+    driver.get(page_URL)
+    wait_for_network_idle(driver)
+    jitter(5)
+    scrape_job_page(driver, job_title, job_location)
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['--retry-failed']: 
+        # Only postings are recorded as dead letters - pages need a browser. 
+        recrawl_dead_letters('careerbuilder', None, extract_visible_text)
+        sys.exit(0)
+
+    if len(sys.argv) == 3 and sys.argv[1] == '--batch': 
+        searches = read_searches(sys.argv[2], num_fields=2)
+    else: 
+        try: 
+            searches = [(sys.argv[1], sys.argv[2])]
+        except IndexError: 
+            raise Exception('Program needs a job title and job location ' 
+                    '(or --batch and a CSV of them) inputted!')
+
+    # Every search (and page of results) shares one pool of warm browsers. 
+    run_browser_pages(searches, gen_page_tasks, scrape_page, pool_size=4)
@@ -0,0 +1,237 @@
+"""A module for issuing large numbers of get requests concurrently.
+
+This module currently provides one class - `AsyncFetcher` - and one helper
+function that wraps it - `fetch_all`. Rather than spawning an OS thread per
+request (as `HrefQueryThread` does), `AsyncFetcher` drives every request from a
+single asyncio event loop. This allows for thousands of requests to be in flight
+at once, at the cost of only a coroutine (rather than a thread) per request.
+Like `get_content`, it can check a `query_utilities.ResponseCache` before issuing
+each request, and retries transient failures the same way.
+"""
+
+import asyncio
+import aiohttp
+from general_utilities.query_utilities import (ACCEPT_ENCODING, CHUNK_SIZE, 
+        MAX_CONTENT_BYTES, HTML_CONTENT_TYPES, is_allowed_content_type)
+from general_utilities.scheduling_utilities import get_host_scheduler
+from general_utilities.retry_utilities import (FetchError, classify_error,
+        gen_backoff, MAX_ATTEMPTS, PERMANENT, RETRY_STATUS_CODES)
+
+class AsyncFetcher(object): 
+    """Asyncio based class to issue get requests against many URLs at once.
+
+    AsyncFetcher issues a get request on each inputted URL, bounding the number
+    of requests that are in flight at once both in total and per host (so that
+    a long list of postings from a single site doesn't hammer that site). Within
+    the hard `per_host_concurrency` cap, each host's requests are paced by a
+    `scheduling_utilities.HostScheduler`, which adapts to how the host responds. All
+    requests share one `aiohttp.ClientSession`, and as a result reuse pooled
+    keep-alive connections.
+
+    Like `query_utilities.get_content`, bodies are requested compressed and
+    streamed in - a body is skipped (returned empty) if its content type isn't
+    one of `content_types`, and cut off after `max_bytes`.
+
+    If a `cache` is passed in, fresh cached bodies are returned without issuing a
+    request, stale ones are revalidated with a conditional request (and reused
+    if the server answers with a 304), and any new bodies are cached. Reads and
+    writes to the cache block on SQLite, so they're run on the event loop's
+    default executor, rather than holding up every other request.
+
+    Any `headers` and `cookies` passed in are sent with every request (e.g. to
+    share the session of a Selenium browser - see
+    `navigation_utilities.gen_session_kwargs`).
+
+    Args: 
+    ----
+        max_concurrency (optional): int
+            Holds the maximum number of requests to have in flight at once.
+        per_host_concurrency (optional): int
+            Holds the maximum number of requests to have in flight at once
+            against any single host.
+        timeout (optional): int
+            Holds the number of seconds to allow for each request.
+        cache (optional): query_utilities.ResponseCache
+        scheduler (optional): scheduling_utilities.HostScheduler
+            Defaults to the scheduler shared by this process.
+        max_bytes (optional): int
+        content_types (optional): set of strings
+            Holds the content types to read. Pass None to read any type.
+        headers (optional): dct
+        cookies (optional): dct
+    """
+
+    def __init__(self, max_concurrency=100, per_host_concurrency=10, timeout=30,
+            cache=None, scheduler=None, max_bytes=MAX_CONTENT_BYTES,
+            content_types=HTML_CONTENT_TYPES, headers=None, cookies=None): 
+        self.max_concurrency = max_concurrency
+        self.per_host_concurrency = per_host_concurrency
+        self.timeout = timeout
+        self.cache = cache
+        self.scheduler = scheduler if scheduler is not None else \
+                get_host_scheduler()
+        self.max_bytes = max_bytes
+        self.content_types = content_types
+        self.headers = headers or {}
+        self.cookies = cookies
+
+    def run(self, urls): 
+        """Fetch the inputted URLs, running an event loop until all are done.
+
+        Args: 
+        ----
+            urls: list of strings
+
+        Returns: 
+        -------
+            contents: list
+                Holds the body (bytes) of the response for each URL, in the same
+                order as `urls`. Holds None for any URL that was empty, and a
+                `retry_utilities.FetchError` for any URL whose request failed
+                (after retrying transient failures).
+        """
+
+        return asyncio.run(self.fetch_all(urls))
+
+    async def fetch_all(self, urls): 
+        """Fetch the inputted URLs from within an already running event loop.
+
+        Args: 
+        ----
+            urls: list of strings
+
+        Returns: 
+        -------
+            contents: list (see `run`)
+        """
+
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency,
+                limit_per_host=self.per_host_concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        headers = dict(self.headers, **{'Accept-Encoding': ACCEPT_ENCODING})
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                headers=headers, cookies=self.cookies) as session:
+            tasks = [self._fetch(session, url) for url in urls]
+            contents = await asyncio.gather(*tasks)
+
+        return contents
+
+    async def _fetch(self, session, url): 
+        """Issue a get request on the inputted URL.
+
+        Args: 
+        ----
+            session: aiohttp.ClientSession
+            url: str
+
+        Returns: bytes, FetchError, or None
+        """
+
+        if not url:
+            return None
+
+        loop = asyncio.get_running_loop()
+        cached = await loop.run_in_executor(None, self.cache.lookup, url) if \
+                self.cache is not None else None
+        if cached is not None and self.cache.is_fresh(cached):
+            return cached.body
+        headers = self.cache.gen_conditional_headers(cached) if cached else {}
+
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            error, status_code = None, None
+            try:
+                # Take the host's slot before a global one, so that requests
+                # waiting on a slow (or paused) host don't hold up requests to
+                # other hosts.
+                async with self.scheduler.async_slot(url) as outcome, \
+                        self._semaphore, \
+                        session.get(url, headers=headers) as response:
+                    status_code = response.status
+                    outcome.record(status_code,
+                            response.headers.get('Retry-After'))
+                    if status_code not in RETRY_STATUS_CODES:
+                        return await self._read_response(url, response, cached)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+
+            kind = classify_error(error, status_code)
+            reason = repr(error) if error is not None else \
+                    'status code {}'.format(status_code)
+            if kind == PERMANENT or attempt == MAX_ATTEMPTS:
+                fetch_error = FetchError(url, kind, reason, status_code, attempt)
+                print(fetch_error)
+                return fetch_error
+            await asyncio.sleep(gen_backoff(attempt))
+
+    async def _read_response(self, url, response, cached): 
+        """Read the content of the response (see `_fetch`).
+
+        Args: 
+        ----
+            url: str
+            response: aiohttp.ClientResponse
+            cached: query_utilities.CachedResponse or None
+
+        Returns: bytes
+        """
+
+        loop = asyncio.get_running_loop()
+        if cached is not None and response.status == 304:
+            await loop.run_in_executor(None, self.cache.refresh, url)
+            return cached.body
+
+        content_type = response.headers.get('Content-Type')
+        if not is_allowed_content_type(content_type, self.content_types):
+            print('Skipping {} URL: {}'.format(content_type, url))
+            return b''
+
+        content, complete = await self._read_stream(response)
+        if response.status != 200:
+            print('Bad URL: {}'.format(url))
+        elif not complete:
+            print('Truncated to {:,} bytes: {}'.format(self.max_bytes, url))
+        elif self.cache is not None:
+            await loop.run_in_executor(None, self.cache.store, url, content,
+                    response.headers)
+        return content
+
+    async def _read_stream(self, response): 
+        """Read the body of the response, stopping once past `max_bytes`.
+
+        Args: 
+        ----
+            response: aiohttp.ClientResponse
+
+        Returns: 
+        -------
+            content: bytes
+            complete: bool
+                Holds whether the whole body was read.
+        """
+
+        buffer = bytearray()
+        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+            buffer.extend(chunk)
+            if len(buffer) > self.max_bytes:
+                return bytes(buffer[:self.max_bytes]), False
+
+        return bytes(buffer), True
+
+def fetch_all(urls, **fetcher_kwargs): 
+    """Fetch the inputted URLs concurrently using an `AsyncFetcher`.
+
+    Args: 
+    ----
+        urls: list of strings
+        **fetcher_kwargs:
+            Passed on to the `AsyncFetcher` constructor.
+
+    Returns: 
+    -------
+        contents: list (see `AsyncFetcher.run`)
+    """
+
+    fetcher = AsyncFetcher(**fetcher_kwargs)
+    return fetcher.run(urls)
@@ -0,0 +1,209 @@
+"""A module to help out with running many searches in one go.
+
+This module currently provides three helper functions - `read_searches`, to read
+a list of searches (e.g. job title, job location, and radius) from a CSV,
+`run_searches`, to scrape all of them through a single `multiprocessing.Pool`,
+and `recrawl_dead_letters`, to re-crawl just the searches, pages, and postings
+that failed on earlier runs.
+
+Running each search as its own program means paying for interpreter startup, a
+new pool of worker processes, and new connections (HTTP and Mongo) per search.
+`run_searches` starts the pool once, and its workers keep their connections (and
+buffered writers - see `storage_utilities.get_buffered_writer`) across every
+search in the batch.
+"""
+
+import csv
+import multiprocessing
+from general_utilities.async_utilities import fetch_all
+from general_utilities.retry_utilities import FetchError
+from general_utilities.storage_utilities import (store_in_mongo, filter_unstored,
+        record_dead_letter, load_dead_letters, remove_dead_letter)
+
+def read_searches(path, num_fields): 
+    """Read a list of searches from the inputted CSV.
+
+    Each row holds one search (e.g. `Data Science,Denver,25`). Blank rows, and
+    rows starting with '#', are skipped.
+
+    Args: 
+    ----
+        path: str
+        num_fields: int
+            Holds the number of fields each search should have.
+
+    Returns: 
+    -------
+        searches: list of tuples
+    """
+
+    searches = []
+    with open(path, newline='') as searches_file:
+        for line_num, row in enumerate(csv.reader(searches_file), start=1):
+            if not row or not ''.join(row).strip() or row[0].startswith('#'):
+                continue
+            if len(row) != num_fields:
+                error = 'Line {} of {} should have {} fields, but has {}.'.format(
+                        line_num, path, num_fields, len(row))
+                raise ValueError(error)
+            searches.append(tuple(field.strip() for field in row))
+
+    return searches
+
+def run_searches(searches, gen_page_tasks, scrape_page, processes=None,
+        site=None): 
+    """Scrape every page of every inputted search, through one pool of workers.
+
+    Both the search queries (e.g. to find the number of jobs for a search) and
+    the pages they turn up are handed out to the same pool from a single work
+    queue. Pages are queued as soon as their search has been queried, so workers
+    can start on the first search's pages while the rest are still being
+    queried. The pool is closed and joined at the end, so that each worker
+    flushes its buffered results before it exits.
+
+    An error querying a single search, or scraping a single page, is printed,
+    rather than stopping the batch. If a `site` is passed in, searches whose
+    query can't be fetched (after retrying) are also recorded as dead letters,
+    so they can be re-crawled later (see `recrawl_dead_letters`).
+
+    Args: 
+    ----
+        searches: list of tuples
+        gen_page_tasks: function
+            Takes a search, and returns a list of tuples holding the arguments
+            to pass to `scrape_page` for each of its pages.
+        scrape_page: function
+        processes (optional): int
+            Holds the number of worker processes. Defaults to the number of
+            available cores.
+        site (optional): str
+            Holds the name of the site's dead letter collection.
+    """
+
+    pool = multiprocessing.Pool(processes or multiprocessing.cpu_count())
+    try:
+        search_results = pool.imap_unordered(_run_search_task,
+                ((gen_page_tasks, search, site) for search in searches))
+        page_tasks = ((scrape_page, page_task) for page_tasks in search_results
+                for page_task in page_tasks)
+        for _ in pool.imap_unordered(_run_page_task, page_tasks):
+            pass
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+def _run_search_task(task): 
+    """Call `gen_page_tasks` on the inputted search.
+
+    Args: 
+    ----
+        task: tuple
+            Holds `gen_page_tasks`, the search to pass to it, and the name of the
+            site's dead letter collection (or None).
+
+    Returns: 
+    -------
+        page_tasks: list of tuples
+    """
+
+    gen_page_tasks, search, site = task
+    try:
+        return gen_page_tasks(search)
+    except FetchError as e:
+        print('Error querying search {}: {!r}'.format(search, e))
+        # Keep track of the search, so it can be re-queried later on.
+        if site is not None:
+            record_dead_letter(e, site, search=search)
+        return []
+    except Exception as e:
+        print('Error querying search {}: {!r}'.format(search, e))
+        return []
+
+def _run_page_task(task): 
+    """Call `scrape_page` with the inputted page task's arguments.
+
+    Args: 
+    ----
+        task: tuple
+            Holds `scrape_page`, and a tuple of the arguments to pass to it.
+    """
+
+    scrape_page, page_task = task
+    try:
+        scrape_page(*page_task)
+    except Exception as e:
+        print('Error scraping page {}: {!r}'.format(page_task, e))
+
+def recrawl_dead_letters(site, scrape_page, parse_posting,
+        db_name='job_postings', max_failures=5, gen_page_tasks=None): 
+    """Re-crawl the searches, pages, and postings that failed on earlier runs.
+
+    Searches recorded as dead letters are re-queried with `gen_page_tasks`, and
+    each of their pages scraped with `scrape_page`. Pages recorded as dead letters are re-scraped with `scrape_page` (which
+    records them again if they fail again). Postings are re-fetched, and those
+    that come back have their text parsed with `parse_posting` and are stored.
+    Dead letters that succeed are removed (postings only once they're stored),
+    and those that have failed `max_failures` times are left alone.
+
+    Sites that only record postings (e.g. the Selenium based ones, whose pages
+    need a browser to scrape) can pass None for `scrape_page`, and sites that
+    don't record searches can leave out `gen_page_tasks`.
+
+    Args: 
+    ----
+        site: str
+            Holds the name of the site, which is also the name of its dead
+            letter collection and of its collection in `db_name`.
+        scrape_page: function or None
+        parse_posting: function
+            Takes the content of a posting, and returns its text.
+        db_name (optional): str
+        max_failures (optional): int
+        gen_page_tasks (optional): function
+    """
+
+    dead_letters = load_dead_letters(site, max_failures)
+    search_letters = [letter for letter in dead_letters if letter.get('search')
+            and gen_page_tasks is not None and scrape_page is not None]
+    page_letters = [letter for letter in dead_letters if letter['page_task']
+            and scrape_page is not None]
+    posting_letters = [letter for letter in dead_letters if
+            letter['document'] is not None]
+    print('Re-crawling {} searches, {} pages, and {} postings for {}'.format(
+        len(search_letters), len(page_letters), len(posting_letters), site))
+
+    for dead_letter in search_letters:
+        search = tuple(dead_letter['search'])
+        try:
+            page_tasks = gen_page_tasks(search)
+        except FetchError as e:
+            record_dead_letter(e, site, search=search)
+            continue
+        remove_dead_letter(dead_letter, site)
+        for page_task in page_tasks:
+            scrape_page(*page_task)
+
+    for dead_letter in page_letters:
+        scrape_page(*dead_letter['page_task'])
+        remove_dead_letter(dead_letter, site)
+
+    contents = fetch_all([letter['url'] for letter in posting_letters])
+    documents, fetched_letters = [], []
+    for dead_letter, content in zip(posting_letters, contents):
+        if isinstance(content, FetchError):
+            record_dead_letter(content, site, document=dead_letter['document'])
+            continue
+        document = dead_letter['document']
+        document['posting_txt'] = parse_posting(content)
+        documents.append(document)
+        fetched_letters.append(dead_letter)
+
+    store_in_mongo(filter_unstored(documents, db_name, site, 'posting_key'),
+            db_name, site)
+    # Only remove the dead letters once their postings are stored, so that they
+    # are re-crawled again if storing them fails.
+    for dead_letter in fetched_letters:
+        remove_dead_letter(dead_letter, site)
@@ -0,0 +1,97 @@
+"""A script for benchmarking `extract_visible_text` against BeautifulSoup.
+
+This script compares `parsing_utilities.extract_visible_text` against the
+approach it replaces - building a BeautifulSoup tree with 'html.parser', grabbing
+every text element from it, and filtering those with `find_visible_texts`. For
+each inputted page, it reports the time each approach takes per parse, and checks
+that both produce the same words.
+
+`extract_visible_text` drops the contents of every tag in `INVISIBLE_TAGS` (most
+notably <script>), as well as comments, which the old approach kept. The check is
+therefore made against the old approach with those dropped as well, and the
+number of words this removes from the old output is reported alongside it.
+
+Usage:
+
+    python benchmark_visible_text.py <url or file path> [<url or file path> ...]
+"""
+
+import sys
+import os
+wd = os.path.abspath('.')
+sys.path.append(wd + '/../')
+import timeit
+from bs4 import BeautifulSoup, Comment
+from general_utilities.query_utilities import get_content
+from general_utilities.parsing_utilities import (find_visible_texts,
+        extract_visible_text, INVISIBLE_TAGS)
+
+def soup_visible_text(content, drop_invisible=False): 
+    """Grab the visible text from the content, the way we did before.
+
+    Args: 
+    ----
+        content: bytes
+        drop_invisible (optional): bool
+            Whether or not to also drop comments and text nested anywhere
+            inside of `INVISIBLE_TAGS`, to line up with `extract_visible_text`.
+
+    Returns: str
+    """
+
+    soup = BeautifulSoup(content, 'html.parser')
+    texts = filter(find_visible_texts, soup.findAll(text=True))
+    if drop_invisible:
+        texts = [text for text in texts if not isinstance(text, Comment) and
+                 not any(parent.name in INVISIBLE_TAGS for parent in text.parents)]
+
+    return ' '.join(texts)
+
+def benchmark_page(content, number=20): 
+    """Time both approaches on the content, and compare their output.
+
+    Args: 
+    ----
+        content: bytes
+        number (optional): int
+            Holds the number of times to parse the content with each approach.
+
+    Returns: 
+    -------
+        results: dct
+    """
+
+    soup_time = timeit.timeit(lambda: soup_visible_text(content),
+            number=number) / number
+    lxml_time = timeit.timeit(lambda: extract_visible_text(content),
+            number=number) / number
+
+    soup_words = soup_visible_text(content).split()
+    reference_words = soup_visible_text(content, drop_invisible=True).split()
+    lxml_words = extract_visible_text(content).split()
+
+    results = {'soup_ms': soup_time * 1000, 'lxml_ms': lxml_time * 1000,
+            'speedup': soup_time / lxml_time, 'match': reference_words == lxml_words,
+            'num_words': len(lxml_words),
+            'num_invisible_words': len(soup_words) - len(reference_words)}
+
+    return results
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        raise Exception('Program needs at least one URL or file path inputted!')
+
+    for page in sys.argv[1:]:
+        if os.path.exists(page):
+            with open(page, 'rb') as page_file:
+                content = page_file.read()
+        else:
+            content = get_content(page)
+
+        results = benchmark_page(content)
+        print(('{}\n    {:,} bytes, {:,} words: BeautifulSoup {:.2f} ms, lxml '
+               '{:.2f} ms ({:.1f}x faster), output matches: {} (ignoring {:,} '
+               'words of scripts/comments)').format(page, len(content),
+                   results['num_words'], results['soup_ms'], results['lxml_ms'],
+                   results['speedup'], results['match'],
+                   results['num_invisible_words']))
@@ -0,0 +1,218 @@
+"""A module to help out with checking whether something has already been stored.
+
+This module currently provides one class - `FingerprintIndex` - that keeps a
+compact, on-disk set of 64-bit fingerprints of the values of a field in a Mongo
+collection (e.g. the `web_url` of every stored article). Checking a value
+against it avoids loading every value in the collection into memory, and avoids
+a round trip to Mongo for each check.
+"""
+
+import bisect
+import hashlib
+import heapq
+import json
+import os
+import threading
+from array import array
+from bson import ObjectId
+
+class FingerprintIndex(object): 
+    """Compact set of fingerprints for a field's values, persisted between runs.
+
+    Each value is hashed to a 64-bit fingerprint, and fingerprints are held in a
+    sorted `array` (8 bytes apiece) that is searched with `bisect`. The chance of
+    two different values sharing a fingerprint is negligible (on the order of
+    1 in 10^10 for 10 million values), but if it matters, pass `verify=True` to
+    confirm every hit against Mongo.
+
+    The index is kept in sync in two ways. Values passed to `add` are appended to
+    a log file as they're added, so they survive a crash. And on `open`, any
+    documents inserted into the collection since the index was last opened (by
+    this or any other program) are read from Mongo and added. The first `open`
+    builds the index from the full collection - every later `open` only reads the
+    sorted array from disk and the documents that are new since. On `close`, the
+    log is merged into the sorted array.
+
+    Args: 
+    ----
+        path: str
+            Holds a filepath location for the index. `<path>.log` and
+            `<path>.meta` are also written alongside it.
+        collection: pymongo.collection.Collection
+        field: str
+        verify (optional): bool
+    """
+
+    def __init__(self, path, collection, field, verify=False): 
+        self.path = path
+        self.log_path = path + '.log'
+        self.meta_path = path + '.meta'
+        self.collection = collection
+        self.field = field
+        self.verify = verify
+        self._fingerprints = array('Q')
+        self._recent = set()
+        self._log_file = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(value): 
+        """Return the 64-bit fingerprint of the inputted value.
+
+        Args: 
+        ----
+            value: str
+
+        Returns: int
+        """
+
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'little')
+
+    def open(self): 
+        """Load the index from disk, and add any documents new to the collection."""
+
+        dirname = os.path.dirname(self.path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+        self._fingerprints = array('Q')
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as index_file:
+                num_fingerprints = os.fstat(index_file.fileno()).st_size // 8
+                self._fingerprints.fromfile(index_file, num_fingerprints)
+
+        self._recent = set()
+        if os.path.exists(self.log_path):
+            log_fingerprints = array('Q')
+            with open(self.log_path, 'rb') as log_file:
+                log_fingerprints.frombytes(log_file.read())
+            self._recent.update(log_fingerprints)
+
+        self._log_file = open(self.log_path, 'ab')
+        self._sync()
+
+    def close(self): 
+        """Merge the log into the sorted array, and save both to disk."""
+
+        with self._lock:
+            self._merge(self._recent)
+            self._log_file.close()
+            os.remove(self.log_path)
+            self._log_file = None
+            self._recent = set()
+
+    def __contains__(self, value): 
+        # Documents without a value for the field (or with a null one) are never
+        # indexed.
+        if value is None:
+            return False
+
+        fingerprint = self.fingerprint(value)
+        with self._lock:
+            found = fingerprint in self._recent or \
+                    self._contains_sorted(fingerprint)
+
+        if found and self.verify:
+            found = self.collection.find_one({self.field: value},
+                    {'_id': True}) is not None
+
+        return found
+
+    def add(self, value): 
+        """Add the inputted value to the index.
+
+        Values of None are skipped, since they can't be fingerprinted.
+
+        Args: 
+        ----
+            value: str or None
+        """
+
+        if value is None:
+            return
+
+        fingerprint = self.fingerprint(value)
+        with self._lock:
+            if fingerprint in self._recent or self._contains_sorted(fingerprint):
+                return
+            self._recent.add(fingerprint)
+            self._log_file.write(array('Q', [fingerprint]).tobytes())
+            self._log_file.flush()
+
+    def _contains_sorted(self, fingerprint): 
+        """Return whether the fingerprint is in the sorted array.
+
+        Args: 
+        ----
+            fingerprint: int
+
+        Returns: bool
+        """
+
+        idx = bisect.bisect_left(self._fingerprints, fingerprint)
+        return idx < len(self._fingerprints) and \
+                self._fingerprints[idx] == fingerprint
+
+    def _sync(self): 
+        """Add documents inserted into the collection since the last sync.
+
+        The `_id` of the newest document seen is kept in the meta file. Because
+        ObjectIds start with their creation time, every document inserted since
+        has a larger `_id` (this assumes the collection uses the default 
+        ObjectIds for `_id`). Documents whose value for the field isn't a string
+        (e.g. null) are skipped.
+        """
+
+        last_id = None
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as meta_file:
+                last_id = json.load(meta_file).get('last_id')
+
+        query = {self.field: {'$type': 'string'}}
+        if last_id is not None:
+            query['_id'] = {'$gt': ObjectId(last_id)}
+
+        new_fingerprints = array('Q')
+        cursor = self.collection.find(query, {self.field: True}).sort('_id', 1)
+        for document in cursor:
+            new_fingerprints.append(self.fingerprint(document[self.field]))
+            last_id = document['_id']
+
+        if new_fingerprints:
+            with self._lock:
+                self._merge(new_fingerprints)
+            with open(self.meta_path, 'w') as meta_file:
+                json.dump({'last_id': str(last_id)}, meta_file)
+
+    def _merge(self, fingerprints): 
+        """Merge the inputted fingerprints into the sorted array, and save it.
+
+        Args: 
+        ----
+            fingerprints: iterable of ints
+        """
+
+        self._fingerprints = array('Q', _merge_unique(self._fingerprints,
+                sorted(fingerprints)))
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as index_file:
+            self._fingerprints.tofile(index_file)
+        os.replace(tmp_path, self.path)
+
+def _merge_unique(*sorted_iterables): 
+    """Merge the inputted sorted iterables, dropping duplicates.
+
+    Args: 
+    ----
+        *sorted_iterables: iterables of ints
+
+    Returns: generator of ints
+    """
+
+    previous = None
+    for value in heapq.merge(*sorted_iterables):
+        if value != previous:
+            yield value
+            previous = value
@@ -0,0 +1,85 @@
+"""A module to help out with pulling fields out of rows of results.
+
+This module currently provides one class - `ExtractionSpec` - that holds a
+mapping of field names to the CSS selectors used to find them, compiled once up
+front. It can then be applied to each row (e.g. each job on a page of results)
+to pull out all of the fields, without parsing each field's selector again for
+every row.
+"""
+
+import time
+import soupsieve
+
+class ExtractionSpec(object): 
+    """Compiled mapping of field names to the CSS selectors to extract them with.
+
+    For each field, the first tag in the row that matches its selector (i.e.
+    what `row.select_one(selector)` would return) is used, and its text (or the
+    inputted attribute) is extracted. Fields that don't match any tag in the row
+    are left out of the results.
+
+    If `profile` is True, the time spent matching each field's selector is
+    accumulated in `self.field_times`, which can be used to see which fields are
+    the most expensive to extract.
+
+    Args: 
+    ----
+        fields: dct
+            Maps each field name to either a CSS selector (to extract the text of
+            the matching tag), or a tuple holding a CSS selector and the name of
+            an attribute (to extract that attribute of the matching tag).
+        profile (optional): bool
+    """
+
+    def __init__(self, fields, profile=False): 
+        self.fields = []
+        for field_name, field_spec in fields.items():
+            if isinstance(field_spec, str):
+                selector, attribute = field_spec, None
+            else:
+                selector, attribute = field_spec
+            self.fields.append((field_name, soupsieve.compile(selector), attribute))
+
+        self.profile = profile
+        self.field_times = {field_name: 0 for field_name, _, _ in self.fields}
+
+    def extract(self, row): 
+        """Extract every field from the inputted row.
+
+        Args: 
+        ----
+            row: bs4.element.Tag
+
+        Returns: 
+        -------
+            extracted: dct
+        """
+
+        extracted = {}
+        for field_name, selector, attribute in self.fields:
+            if self.profile:
+                start_time = time.perf_counter()
+                tag = selector.select_one(row)
+                self.field_times[field_name] += time.perf_counter() - start_time
+            else:
+                tag = selector.select_one(row)
+
+            if tag is not None:
+                extracted[field_name] = tag.get(attribute) if attribute \
+                        else tag.text
+
+        return extracted
+
+    def extract_all(self, rows): 
+        """Extract every field from each of the inputted rows.
+
+        Args: 
+        ----
+            rows: list of bs4.element.Tag
+
+        Returns: 
+        -------
+            extracted: list of dictionaries
+        """
+
+        return [self.extract(row) for row in rows]
@@ -0,0 +1,138 @@
+"""A module to help out with keeping track of what has already been scraped.
+
+This module currently provides one class - `CrawlLedger` - that records which
+units of work (e.g. a date for a given set of query parameters) have been
+started and finished, in a small SQLite database on disk. Each update is
+committed as it is made, so the ledger survives a crash partway through a
+crawl, and lookups go through the table's primary key rather than a scan.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+class CrawlLedger(object): 
+    """Record of crawl units that have been started and finished.
+
+    Each entry is keyed by a `query` (see `gen_query_key`) and a `unit` (e.g. a
+    date), and holds the status of that unit - `PENDING` once it has been
+    started, and `DONE` once it has been finished. A single ledger can be shared
+    by the threads of a process, and multiple processes can point at the same
+    `path`.
+
+    Args: 
+    ----
+        path: str
+            Holds a filepath location for the SQLite database. Created (along
+            with its directory) if it doesn't exist.
+    """
+
+    PENDING = 0
+    DONE = 1
+
+    def __init__(self, path): 
+        self.path = path
+        self._lock = threading.Lock()
+
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+        # Autocommit mode, so that every update is durable as soon as it's made.
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None,
+                check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS ledger (
+                                  query TEXT NOT NULL,
+                                  unit TEXT NOT NULL,
+                                  status INTEGER NOT NULL,
+                                  updated_at REAL NOT NULL,
+                                  PRIMARY KEY (query, unit))''')
+
+    def __enter__(self): 
+        return self
+
+    def __exit__(self, *args): 
+        self.close()
+
+    @staticmethod
+    def gen_query_key(params, exclude=()): 
+        """Generate a key for the inputted query parameters.
+
+        Args: 
+        ----
+            params: dct
+            exclude (optional): iterable
+                Holds parameters to leave out of the key (e.g. API keys, or the
+                parameters that make up the unit).
+
+        Returns: str
+        """
+
+        key_params = {k: v for k, v in params.items() if k not in exclude}
+        return json.dumps(key_params, sort_keys=True)
+
+    def status(self, query, unit): 
+        """Return the status of the inputted unit.
+
+        Args: 
+        ----
+            query: str
+            unit: str
+
+        Returns: int (`PENDING` or `DONE`), or None if the unit isn't recorded.
+        """
+
+        with self._lock:
+            row = self._conn.execute(
+                    'SELECT status FROM ledger WHERE query = ? AND unit = ?',
+                    (query, unit)).fetchone()
+
+        return row[0] if row else None
+
+    def is_done(self, query, unit): 
+        """Return whether or not the inputted unit has been finished.
+
+        Args: 
+        ----
+            query: str
+            unit: str
+
+        Returns: bool
+        """
+
+        return self.status(query, unit) == self.DONE
+
+    def mark_pending(self, query, unit): 
+        """Record the inputted unit as started, unless it's already recorded.
+
+        Args: 
+        ----
+            query: str
+            unit: str
+        """
+
+        with self._lock:
+            self._conn.execute('INSERT OR IGNORE INTO ledger VALUES (?, ?, ?, ?)',
+                    (query, unit, self.PENDING, time.time()))
+
+    def mark_done(self, query, unit): 
+        """Record the inputted unit as finished.
+
+        Args: 
+        ----
+            query: str
+            unit: str
+        """
+
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO ledger VALUES (?, ?, ?, ?)',
+                    (query, unit, self.DONE, time.time()))
+
+    def close(self): 
+        """Close the connection to the database."""
+
+        with self._lock:
+            self._conn.close()
@@ -1,78 +1,552 @@
-"""A module to use for navigating the JS in webpages. 
+"""A module to use for navigating the JS in webpages.
 
-This module currently provides a single function (`issue_driver_query`), which 
-opens up a Selenium Browser to help navigate around the JS in web page searches.
+This module currently provides a couple of helper functions - `build_driver`,
+`issue_driver_query`, `query_page`, `gen_session_kwargs`, `run_browser_searches`,
+and `run_browser_pages` - along with a class that keeps a pool of warm browsers
+to run searches in - `BrowserPool`. Together, these open up Selenium Browsers to
+help navigate around the JS in web page searches.
+
+Navigating waits on conditions - an element being present, the network going
+idle, or the page changing - rather than sleeping for a fixed (or random) amount
+of time (see `wait_for` and friends). Human-like pauses between actions are
+separate from this, and off by default (see `jitter`).
 """
 
-import time 
-import random
 import os
-from pyvirtualdisplay import Display
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from selenium import webdriver
+from selenium.common.exceptions import StaleElementReferenceException
 from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.common.by import By
+from selenium.webdriver.firefox.options import Options
+from selenium.webdriver.support import expected_conditions
+from selenium.webdriver.support.ui import WebDriverWait
+
+# Number of times to re-issue a query that lands on a `beta` version of a site.
+MAX_BETA_RETRIES = 5
+
+# Seconds to wait on a condition before giving up on it, and between checks of
+# the condition.
+WAIT_TIMEOUT = 20
+POLL_INTERVAL = 0.1
+
+# Seconds without any new requests from a page before its network counts as idle.
+NETWORK_IDLE_TIME = 0.5
+
+# Scale applied to the human-like pauses taken between actions (see `jitter`).
+# Defaults to 0, which turns them off - set `JOB_SCRAPER_JITTER` to 1 to pause
+# for about as long as a person might.
+JITTER_SCALE = float(os.environ.get('JOB_SCRAPER_JITTER', 0))
+
+def build_driver(headless=True): 
+    """Start up a new Firefox browser.
+
+    Firefox's own headless mode is used (rather than a virtual display), which
+    works anywhere - including on servers without a display (on AWS, for
+    example).
+
+    Args: 
+    ----
+        headless (optional): bool
+
+    Returns: 
+    -------
+        driver: Selenium webdriver
+    """
+
+    options = Options()
+    if headless:
+        options.add_argument('-headless')
+
+    # No implicit wait is set, since it would stack on top of (and slow down) the
+    # explicit waits used to navigate (see `wait_for`).
+    return webdriver.Firefox(options=options)
+
+class BrowserPool(object): 
+    """Pool of warm browsers, handed out one search at a time.
+
+    Starting up a browser takes seconds, so rather than starting one per search,
+    the pool keeps up to `size` of them running, and hands them out with
+    `browser`. When a browser is handed back, its state (cookies, storage, and
+    any extra windows) is reset, so the next search starts fresh. Each browser
+    is shut down and replaced after `max_uses` searches (or after a search that
+    raised an exception), so that a long running pool doesn't accumulate leaked
+    memory, or a browser stuck in a bad state.
+
+    Browsers are started lazily, as they're needed. A single pool can be shared
+    by multiple threads.
+
+    Args: 
+    ----
+        size (optional): int
+            Holds the maximum number of browsers to keep running at once.
+        max_uses (optional): int
+        headless (optional): bool
+    """
+
+    def __init__(self, size=2, max_uses=20, headless=True): 
+        self.size = size
+        self.max_uses = max_uses
+        self.headless = headless
+        self._idle = []
+        self._uses = {}
+        self._num_running = 0
+        self._condition = threading.Condition()
+
+    def __enter__(self): 
+        return self
+
+    def __exit__(self, *args): 
+        self.close()
+
+    def browser(self): 
+        """Return a context manager that holds a browser from the pool.
+
+        Blocks until a browser is free (or there's room to start a new one).
+
+            with pool.browser() as driver:
+                driver.get(url)
+        """
+
+        return _PooledBrowser(self)
+
+    def acquire(self): 
+        """Take a browser from the pool, blocking until one is available.
+
+        Returns: 
+        -------
+            driver: Selenium webdriver
+        """
+
+        with self._condition:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._num_running < self.size:
+                    self._num_running += 1
+                    break
+                self._condition.wait()
+
+        try:
+            driver = build_driver(self.headless)
+        except:
+            with self._condition:
+                self._num_running -= 1
+                self._condition.notify()
+            raise
+
+        with self._condition:
+            self._uses[driver] = 0
+        return driver
+
+    def release(self, driver, discard=False): 
+        """Hand a browser back to the pool.
 
-def issue_driver_query(query_URL, query_params=None):
+        Args: 
+        ----
+            driver: Selenium webdriver
+            discard (optional): bool
+                Whether to shut the browser down rather than reuse it (e.g.
+                because it raised an exception).
+        """
+
+        with self._condition:
+            self._uses[driver] += 1
+            worn_out = self._uses[driver] >= self.max_uses
+
+        if not discard and not worn_out:
+            try:
+                reset_driver(driver)
+                with self._condition:
+                    self._idle.append(driver)
+                    self._condition.notify()
+                return
+            except Exception as e:
+                print('Error resetting browser: {!r}'.format(e))
+
+        self._quit(driver)
+
+    def close(self): 
+        """Shut down every idle browser in the pool."""
+
+        with self._condition:
+            idle, self._idle = self._idle, []
+        for driver in idle:
+            self._quit(driver)
+
+    def _quit(self, driver): 
+        """Shut down the inputted browser, making room for a new one.
+
+        Args: 
+        ----
+            driver: Selenium webdriver
+        """
+
+        try:
+            driver.quit()
+        except Exception as e:
+            print('Error shutting down browser: {!r}'.format(e))
+
+        with self._condition:
+            del self._uses[driver]
+            self._num_running -= 1
+            self._condition.notify()
+
+class _PooledBrowser(object): 
+    """Context manager that holds a browser from a `BrowserPool`.
+
+    Args: 
+    ----
+        pool: BrowserPool
+    """
+
+    def __init__(self, pool): 
+        self.pool = pool
+
+    def __enter__(self): 
+        self.driver = self.pool.acquire()
+        return self.driver
+
+    def __exit__(self, exc_type, exc_value, traceback): 
+        self.pool.release(self.driver, discard=exc_type is not None)
+
+def reset_driver(driver): 
+    """Reset the browser's state, so it can be used for a new search.
+
+    Cookies and storage are cleared for the site the browser is on (a pooled
+    browser is only used for one site), extra windows are closed, and the
+    browser is pointed at a blank page.
+
+    Args: 
+    ----
+        driver: Selenium webdriver
+    """
+
+    for window_handle in driver.window_handles[1:]:
+        driver.switch_to.window(window_handle)
+        driver.close()
+    driver.switch_to.window(driver.window_handles[0])
+
+    driver.delete_all_cookies()
+    if driver.current_url.startswith('http'):
+        driver.execute_script('window.localStorage.clear(); '
+                'window.sessionStorage.clear();')
+    driver.get('about:blank')
+
+def issue_driver_query(query_URL, query_params=None, driver=None): 
     """Issue the initial query in order to start scraping.
 
-    First, issue a `.get()` request on the `query_URL` - this will either hold 
-    the homepage from which we will need to use the driver program to perform a 
-    search, or will be the query_URL of the final search (a Selenium Driver might 
+    First, issue a `.get()` request on the `query_URL` - this will either hold
+    the homepage from which we will need to use the driver program to perform a
+    search, or will be the query_URL of the final search (a Selenium Driver might
     not be necessary for the initial query). If the former, then use the
-    `query_params` to grab the search boxes and enter the query parameters. If 
-    the latter, then simply return the Selenium driver. 
-
-    All of the `time.sleep()` calls are used in an attempt to appear as an 
-    actual user (e.g. not a bot). 
+    `query_params` to grab the search boxes and enter the query parameters, and
+    wait for the results to start loading. If the latter, then simply return
+    the Selenium driver.
 
     Args: 
     ----
         query_URL: str
-        query_params (optional): tuple 
+        query_params (optional): tuple
             Holds a tuple of two tuples. The first tuple contains the CSS ID
-            selector to find the job title search box and the job title we 
-            want to search for (in that order), and the second holds the 
-            same for the job location. 
+            selector to find the job title search box and the job title we
+            want to search for (in that order), and the second holds the
+            same for the job location.
+        driver (optional): Selenium webdriver
+            Holds the browser to issue the query in (e.g. one from a
+            `BrowserPool`). If not passed in, a new one is started.
 
     Returns: 
     -------
-        driver: Selenium webdriver 
+        driver: Selenium webdriver
     """
-    
-    # Allows us to run Selenium in a headless fashion (on AWS, for example). 
-    if os.environ['USER'] == 'ubuntu': 
-        display = Display(visible=0, size=(800, 600))
-        display.start()
-    
-    driver = webdriver.Firefox()
-    # Wait long enough for page rendering before searching for an element. 
-    driver.implicitly_wait(10)
+
+    if driver is None:
+        driver = build_driver()
     driver.get(query_URL)
-    time.sleep(3)
 
     # Monster has started using a `beta` version of the site, and the Monster scraper
-    # is not built for it. Here, keep issuing the query to get the non-beta version. 
-    while 'beta' in driver.current_url: 
-        driver.close()
-        driver = webdriver.Firefox()
-        driver.implicitly_wait(10)
+    # is not built for it. Here, keep issuing the query (with fresh cookies) to get
+    # the non-beta version.
+    for _ in range(MAX_BETA_RETRIES):
+        if 'beta' not in driver.current_url:
+            break
+        driver.delete_all_cookies()
         driver.get(query_URL)
 
-    # Wait extra time for the page to render. 
-    time.sleep(random.randint(7, 15))
-    
-    if query_params: 
-        # Find search boxes. 
-        title_search = driver.find_element_by_id(query_params[0][0])
-        location_search = driver.find_element_by_id(query_params[1][0])
+    wait_for_network_idle(driver)
+    jitter(10)
+
+    if query_params:
+        # Find search boxes, once they can be typed in.
+        is_title_clickable = expected_conditions.element_to_be_clickable(
+                (By.ID, query_params[0][0]))
+        is_location_clickable = expected_conditions.element_to_be_clickable(
+                (By.ID, query_params[1][0]))
+        title_search = wait_for(driver, is_title_clickable)
+        location_search = wait_for(driver, is_location_clickable)
 
-        # Clear search boxes and enter text. 
+        # Clear search boxes and enter text.
         title_search.clear()
         location_search.clear()
         title_search.send_keys(query_params[0][1])
-        time.sleep(random.randint(3, 5))
+        jitter(4)
         location_search.send_keys(query_params[1][1])
 
-        # Execute that query! 
+        # Execute that query!
         location_search.send_keys(Keys.ENTER)
+        wait_for_new_page(driver, location_search)
 
     return driver
+
+def wait_for(driver, condition, timeout=WAIT_TIMEOUT): 
+    """Wait for the inputted condition to hold, and return its result.
+
+    Args: 
+    ----
+        driver: Selenium webdriver
+        condition: function
+            Takes the driver, and returns something truthy once the condition
+            holds (e.g. one of Selenium's `expected_conditions`).
+        timeout (optional): float
+
+    Returns: 
+    -------
+        result: object
+            Holds the last value returned by `condition`.
+
+    Raises: 
+    ------
+        selenium.common.exceptions.TimeoutException
+    """
+
+    return WebDriverWait(driver, timeout, POLL_INTERVAL,
+            ignored_exceptions=(StaleElementReferenceException,)).until(condition)
+
+def wait_for_element(driver, locator, timeout=WAIT_TIMEOUT): 
+    """Wait for an element to be present on the page, and return it.
+
+    Args: 
+    ----
+        driver: Selenium webdriver
+        locator: tuple
+            Holds how to find the element, and what to find (e.g.
+            `(By.CLASS_NAME, 'jobListing')`).
+        timeout (optional): float
+
+    Returns: 
+    -------
+        element: Selenium WebElement
+    """
+
+    is_present = expected_conditions.presence_of_element_located(locator)
+    return wait_for(driver, is_present, timeout)
+
+def wait_for_network_idle(driver, idle_time=NETWORK_IDLE_TIME,
+        timeout=WAIT_TIMEOUT): 
+    """Wait for the page to finish loading, and stop issuing new requests.
+
+    Selenium doesn't expose the network, so this polls the number of resources
+    the page has requested (from its `performance` timeline), and waits for it
+    to hold steady for `idle_time` seconds.
+
+    Args: 
+    ----
+        driver: Selenium webdriver
+        idle_time (optional): float
+        timeout (optional): float
+    """
+
+    state = {'num_resources': None, 'since': None}
+
+    def is_idle(driver): 
+        ready_state, num_resources = driver.execute_script(
+                "return [document.readyState, "
+                "window.performance.getEntriesByType('resource').length];")
+        now = time.monotonic()
+        if ready_state != 'complete' or num_resources != state['num_resources']:
+            state['num_resources'] = num_resources
+            state['since'] = now
+            return False
+        return now - state['since'] >= idle_time
+
+    wait_for(driver, is_idle, timeout)
+
+def wait_for_new_page(driver, old_element, timeout=WAIT_TIMEOUT): 
+    """Wait for the page to move on from the one holding `old_element`.
+
+    Use this after clicking through to a new page (or a new page of results) -
+    grab any element from the current page beforehand, and this waits for that
+    element to go away (or the URL to change), followed by the network to go
+    idle.
+
+    Args: 
+    ----
+        driver: Selenium webdriver
+        old_element: Selenium WebElement
+        timeout (optional): float
+    """
+
+    old_url = driver.current_url
+    is_stale = expected_conditions.staleness_of(old_element)
+    wait_for(driver, lambda driver: driver.current_url != old_url or
+            is_stale(driver), timeout)
+    wait_for_network_idle(driver, timeout=timeout)
+
+def jitter(max_seconds): 
+    """Pause for a random, human-like amount of time.
+
+    This is on top of the explicit waits, and only meant to make the pace of
+    actions look less mechanical. The pause is up to `max_seconds` scaled by
+    `JITTER_SCALE`, so it's skipped altogether by default.
+
+    Args: 
+    ----
+        max_seconds: float
+    """
+
+    if JITTER_SCALE > 0:
+        time.sleep(random.uniform(0, max_seconds * JITTER_SCALE))
+
+# Script run by `query_page` - reads every field in a single call, rather than a
+# WebDriver round trip per element.
+QUERY_PAGE_SCRIPT = """
+var selectors = arguments[0], attributes = arguments[1], page_data = {};
+Object.keys(selectors).forEach(function (name) {
+    var elements = document.querySelectorAll(selectors[name]);
+    page_data[name] = Array.prototype.map.call(elements, function (element) {
+        var attribute = attributes[name];
+        var value = attribute ? element[attribute] || element.getAttribute(attribute)
+                : element.innerText || element.textContent;
+        return value ? String(value).trim() : '';
+    });
+});
+return page_data;
+"""
+
+def query_page(driver, selectors, attributes=None): 
+    """Grab the text of every element matching each inputted CSS selector.
+
+    Everything is read in a single `execute_script` call, and comes back as
+    plain strings (rather than WebElements, each of which would take another
+    round trip to the browser to read).
+
+    Args: 
+    ----
+        driver: Selenium webdriver
+        selectors: dct
+            Holds the CSS selector to grab the elements of each field with.
+        attributes (optional): dct
+            Holds the attribute to read (rather than the text) for any of
+            the fields (e.g. `{'hrefs': 'href'}`).
+
+    Returns: 
+    -------
+        page_data: dct
+            Holds a list of strings for each field, in page order.
+    """
+
+    return driver.execute_script(QUERY_PAGE_SCRIPT, selectors, attributes or {})
+
+def gen_session_kwargs(driver): 
+    """Build the arguments to issue plain HTTP requests as the inputted browser.
+
+    This lets pages the browser has links to be fetched over plain HTTP (e.g.
+    with `async_utilities.fetch_all`), many at once, rather than clicked through
+    one at a time - while still looking like the same visitor to the site.
+
+    Args: 
+    ----
+        driver: Selenium webdriver
+
+    Returns: 
+    -------
+        session_kwargs: dct
+            Holds the browser's cookies (`cookies`), along with its user agent
+            and current page as the referer (`headers`).
+    """
+
+    cookies = {cookie['name']: cookie['value'] for cookie in driver.get_cookies()}
+    headers = {'User-Agent': driver.execute_script('return navigator.userAgent;'),
+            'Referer': driver.current_url}
+
+    return {'cookies': cookies, 'headers': headers}
+
+def run_browser_searches(searches, scrape_search, pool_size=2, max_uses=20): 
+    """Run every inputted search, each in a browser from a shared `BrowserPool`.
+
+    Searches are run `pool_size` at a time, each in its own thread. An error
+    running a single search is printed, rather than stopping the rest.
+
+    Args: 
+    ----
+        searches: list of tuples
+        scrape_search: function
+            Takes a browser, followed by the fields of a search.
+        pool_size (optional): int
+        max_uses (optional): int
+    """
+
+    def run_search(search): 
+        try:
+            with pool.browser() as driver:
+                scrape_search(driver, *search)
+        except Exception as e:
+            print('Error running search {}: {!r}'.format(search, e))
+
+    with BrowserPool(pool_size, max_uses) as pool, \
+            ThreadPoolExecutor(pool_size) as executor:
+        list(executor.map(run_search, searches))
+
+def run_browser_pages(searches, gen_page_tasks, scrape_page, pool_size=4,
+        max_uses=20): 
+    """Scrape every page of every inputted search, over a shared `BrowserPool`.
+
+    Rather than one browser clicking through a search's pages one after
+    another, each search is queried once (to find its pages), and its pages are
+    then handed out to every browser in the pool, `pool_size` at a time. This is
+    the browser based counterpart of `batch_utilities.run_searches`.
+
+    An error querying a single search, or scraping a single page, is printed,
+    rather than stopping the rest.
+
+    Args: 
+    ----
+        searches: list of tuples
+        gen_page_tasks: function
+            Takes a browser, followed by the fields of a search, and returns a
+            list of tuples holding the arguments to pass to `scrape_page` for
+            each of its pages.
+        scrape_page: function
+            Takes a browser, followed by the arguments of a page task.
+        pool_size (optional): int
+        max_uses (optional): int
+    """
+
+    def run_search_task(search): 
+        try:
+            with pool.browser() as driver:
+                return gen_page_tasks(driver, *search)
+        except Exception as e:
+            print('Error querying search {}: {!r}'.format(search, e))
+            return []
+
+    def run_page_task(page_task): 
+        try:
+            with pool.browser() as driver:
+                scrape_page(driver, *page_task)
+        except Exception as e:
+            print('Error scraping page {}: {!r}'.format(page_task, e))
+
+    with BrowserPool(pool_size, max_uses) as pool, \
+            ThreadPoolExecutor(pool_size) as executor:
+        search_futures = [executor.submit(run_search_task, search) for search in
+                searches]
+        page_futures = [executor.submit(run_page_task, page_task) for
+                search_future in as_completed(search_futures) for page_task in
+                search_future.result()]
+        for page_future in page_futures:
+            page_future.result()
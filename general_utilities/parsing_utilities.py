@@ -1,12 +1,19 @@
 """A module to use for parsing text from websites.
 
-This module currently provides three functions. The first for parsing numbers 
+This module currently provides four functions. The first for parsing numbers 
 out of text, the second for parsing out and returning the "visible" parts of a 
 web page (there are certain tags that we want to avoid pretty much all the time), 
-and the third for parsing out an inputted regex out of inputted text. 
+the third for parsing out an inputted regex out of inputted text, and the fourth 
+(`extract_visible_text`) for pulling all of the visible text out of a raw web page
+without building a BeautifulSoup tree for it. 
 """
 
 import re
+from lxml import etree
+
+# Tags whose contents are never visible on the page. 
+INVISIBLE_TAGS = frozenset(['head', 'title', 'style', 'script', 'noscript', 
+                            'template'])
 
 def parse_num(input_txt, desired_idx): 
     """Parse the text to pull out any numbers. 
@@ -71,3 +78,90 @@ def parse_regex(regex, input_txt):
     parsed_txt = re.sub(regex, '', input_txt)
 
     return matches, parsed_txt
+
+def extract_visible_text(content, skip_tags=INVISIBLE_TAGS): 
+    """Parse the visible text out of the inputted web page. 
+
+    This is a much faster alternative to building a BeautifulSoup tree, grabbing 
+    every text element from it (`soup.findAll(text=True)`), and filtering those 
+    with `find_visible_texts`. The page is run through lxml's (C based) HTML 
+    parser, which streams parsing events to `_VisibleTextTarget` rather than 
+    building a tree, and the contents of `skip_tags` (along with comments) are 
+    dropped without being stored. 
+
+    Args: 
+    ----
+        content: bytes or str
+            Holds the raw web page (e.g. `response.content`). 
+        skip_tags (optional): iterable
+            Holds the tags whose contents (including any nested tags) to skip. 
+
+    Returns: str 
+    """
+
+    if not content: 
+        return ''
+    if isinstance(content, bytes): 
+        # Most pages are UTF-8, but lxml assumes Latin-1 unless the page declares
+        # its encoding. Leave anything that isn't UTF-8 for lxml to work out. 
+        try: 
+            content = content.decode('utf-8')
+        except UnicodeDecodeError: 
+            pass
+
+    target = _VisibleTextTarget(skip_tags)
+    # Parsers can't be shared across threads, so build a new one for each page. 
+    parser = etree.HTMLParser(target=target)
+    try: 
+        parser.feed(content)
+        texts = parser.close()
+    except etree.LxmlError as e: 
+        print(e)
+        texts = target.close()
+
+    return ' '.join(texts)
+
+class _VisibleTextTarget(object): 
+    """Parser target used by `extract_visible_text` to collect visible text. 
+
+    lxml calls `start`, `end`, `data`, and `comment` as it parses the page, and 
+    `close` when it's done. Text is collected unless we are inside of one of the 
+    `skip_tags`, and consecutive chunks of text are joined to make up each of the 
+    text elements that BeautifulSoup would have returned. 
+
+    Args: 
+    ----
+        skip_tags: iterable
+    """
+
+    def __init__(self, skip_tags): 
+        self.skip_tags = frozenset(skip_tags)
+        self.skip_depth = 0
+        self.texts = []
+        self.chunks = []
+
+    def start(self, tag, attrib): 
+        self._end_text()
+        if self.skip_depth or tag in self.skip_tags: 
+            self.skip_depth += 1
+
+    def end(self, tag): 
+        self._end_text()
+        if self.skip_depth: 
+            self.skip_depth -= 1
+
+    def data(self, data): 
+        if not self.skip_depth: 
+            self.chunks.append(data)
+
+    def comment(self, text): 
+        self._end_text()
+
+    def close(self): 
+        self._end_text()
+        return self.texts
+
+    def _end_text(self): 
+        if self.chunks: 
+            self.texts.append(''.join(self.chunks))
+            self.chunks = []
@@ -1,10 +1,80 @@
 """A module to help out with web requests. 
 
-This module currently provides a couple of helper functions for web requests - `format_query`, `get_hmtl`, and `check_response_code`. 
+This module currently provides a couple of helper functions for web requests - 
+`format_query`, `get_session`, `configure_session`, `get_content`, `get_hmtl`, 
+`gen_class_strainer`, `check_response_code`, `is_allowed_content_type`, 
+`set_query_param`, `normalize_url`, `normalize_href`, and `get_response_cache` - 
+along with the on-disk `ResponseCache` that `get_content` can check before 
+issuing a request. 
+
+All requests issued through this module share a single `requests.Session` per 
+process. That session holds a pool of keep-alive connections for each host, so 
+repeated requests against the same site (e.g. every posting on a page of job 
+results) reuse connections rather than paying for a new TCP + TLS handshake each 
+time. 
+
+Responses are requested compressed (see `ACCEPT_ENCODING`) and streamed in, so 
+that a body is only read if it's a type we can parse, and only up to a maximum 
+size (see `get_content`). 
 """
 
-from bs4 import BeautifulSoup
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import namedtuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from bs4 import BeautifulSoup, SoupStrainer
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from general_utilities.scheduling_utilities import get_host_scheduler
+from general_utilities.retry_utilities import (FetchError, classify_error, 
+        gen_backoff, MAX_ATTEMPTS, PERMANENT, RETRY_STATUS_CODES)
+try: 
+    import brotli
+except ImportError: 
+    brotli = None
+
+# Settings used to build each process's session (see `configure_session`). 
+SESSION_SETTINGS = {'pool_connections': 20, 'pool_maxsize': 25, 
+        'max_retries': 3, 'backoff_factor': 0.5}
+
+# Parser used by `get_html` unless another is asked for. 
+DEFAULT_PARSER = 'html.parser'
+
+# Compression schemes we ask servers for. Brotli is only asked for if we can 
+# decode it (urllib3 and aiohttp both decode it when `brotli` is installed). 
+ACCEPT_ENCODING = 'gzip, deflate, br' if brotli is not None else 'gzip, deflate'
+
+# Maximum number of (decompressed) bytes of a body read by `get_content`, and 
+# the content types it will read. Pages without a content type are read too. 
+MAX_CONTENT_BYTES = 5 * 2 ** 20
+HTML_CONTENT_TYPES = frozenset(['text/html', 'application/xhtml+xml', 
+        'text/plain'])
+
+# Number of bytes read at a time when streaming in a body. 
+CHUNK_SIZE = 64 * 2 ** 10
+
+# Query parameters that only track where a click came from, and so are dropped 
+# by `normalize_href`. Any parameter starting with 'utm_' is dropped as well. 
+TRACKING_PARAMS = frozenset(['gclid', 'fbclid', 'from', 'ref', 'refer', 'source', 
+        'src', 'sid', 'tk', 'trk', 'vjs', 'mobvjtk', 'ikw', 'iloc', 'ist'])
+
+# Location of the cache returned by `get_response_cache`, relative to the 
+# directory the scraper is run from. 
+DEFAULT_CACHE_PATH = 'work/response_cache.db'
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+_response_cache = None
+
+CachedResponse = namedtuple('CachedResponse', 
+        ['body', 'etag', 'last_modified', 'stored_at'])
 
 def format_query(base_url, query_parameters): 
     """Structure a URL query given inputted parameters. 
@@ -26,33 +96,287 @@ def format_query(base_url, query_parameters):
 
     return base_url
 
-def get_html(url): 
+def configure_session(**settings): 
+    """Change the settings used to build the shared session. 
+
+    Any session that has already been built in this process is discarded, and 
+    the next call to `get_session` builds a new one with the updated settings. 
+
+    Args: 
+    ----
+        **settings: 
+            Any of the keys in `SESSION_SETTINGS` - `pool_connections` (number 
+            of hosts to keep a connection pool for), `pool_maxsize` (number of 
+            connections to keep alive per host), `max_retries` (number of times 
+            to retry on connection errors), and `backoff_factor` (used to space 
+            out those retries). 
+    """
+
+    global _session
+
+    unknown_settings = set(settings) - set(SESSION_SETTINGS)
+    if unknown_settings: 
+        error = 'Unknown session settings: {}'.format(sorted(unknown_settings))
+        raise ValueError(error)
+
+    with _session_lock: 
+        SESSION_SETTINGS.update(settings)
+        if _session is not None: 
+            _session.close()
+        _session = None
+
+def get_session(): 
+    """Return the `requests.Session` shared by this process. 
+
+    The session is built lazily, and rebuilt if we find ourselves in a different 
+    process than the one that built it (e.g. a `multiprocessing.Pool` worker that 
+    was forked after the parent issued requests). Sockets can't safely be shared 
+    across a fork, but can be shared across the threads of a single process. 
+
+    Returns: 
+    -------
+        session: requests.Session
+    """
+
+    global _session, _session_pid
+
+    pid = os.getpid()
+    if _session is None or _session_pid != pid: 
+        with _session_lock: 
+            if _session is None or _session_pid != pid: 
+                _session = _build_session()
+                _session_pid = pid
+
+    return _session
+
+def _build_session(): 
+    """Build a session with pooled, keep-alive connections. 
+
+    Retries (with exponential backoff) are only issued for errors that occur 
+    while establishing a connection - the request has not reached the server at 
+    that point, so it's always safe to try again. 
+
+    Returns: 
+    -------
+        session: requests.Session
+    """
+
+    max_retries = SESSION_SETTINGS['max_retries']
+    retries = Retry(total=max_retries, connect=max_retries, read=0, status=0, 
+            backoff_factor=SESSION_SETTINGS['backoff_factor'], 
+            raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=SESSION_SETTINGS['pool_connections'], 
+            pool_maxsize=SESSION_SETTINGS['pool_maxsize'], max_retries=retries)
+
+    session = requests.Session()
+    session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    return session
+
+def get_content(url, cache=None, max_bytes=MAX_CONTENT_BYTES, 
+        content_types=HTML_CONTENT_TYPES): 
+    """Issue a get request on the inputted URL and return the raw content. 
+
+    Use this rather than `get_html` when the content doesn't need to be parsed 
+    into a BeautifulSoup object (e.g. when it is passed straight to 
+    `parsing_utilities.extract_visible_text`). 
+
+    Requests go through the process's `HostScheduler` (see 
+    `scheduling_utilities`), which limits how many are in flight against each 
+    host (and how quickly they're issued), adapting to how the host responds. 
+
+    The body is streamed in, rather than read into memory all at once. If its 
+    content type isn't one of `content_types` (e.g. a PDF linked from a job 
+    posting), it isn't read at all and an empty body is returned. If it's longer 
+    than `max_bytes`, only the first `max_bytes` are returned. 
+
+    If a `cache` is passed in, a fresh cached copy of the URL is returned without 
+    issuing a request at all, and a stale one is revalidated with a conditional 
+    request - if the server says it hasn't changed (a 304), the cached body is 
+    returned, and otherwise the new body is cached. 
+
+    Transient failures (e.g. a timeout, a dropped connection, or a 503) are 
+    retried, up to `retry_utilities.MAX_ATTEMPTS` attempts in all, with jittered 
+    exponential backoff between them. Other error responses (e.g. a 404) are 
+    returned as is. 
+
+    Args: 
+    ----
+        url: str
+        cache (optional): ResponseCache
+        max_bytes (optional): int
+        content_types (optional): set of strings
+            Holds the content types to read. Pass None to read any type. 
+    
+    Returns: 
+    ------
+        content: bytes
+
+    Raises: 
+    ------
+        retry_utilities.FetchError: if the request failed for good. 
+    """
+
+    cached = cache.lookup(url) if cache is not None else None
+    if cached is not None and cache.is_fresh(cached): 
+        return cached.body
+    headers = cache.gen_conditional_headers(cached) if cached else {}
+
+    for attempt in range(1, MAX_ATTEMPTS + 1): 
+        error, status_code = None, None
+        try: 
+            # Wait for the host scheduler to give us a slot for this host, and 
+            # let it know how the host responded. 
+            with get_host_scheduler().slot(url) as outcome, \
+                    get_session().get(url, headers=headers, 
+                            stream=True) as response: 
+                status_code = response.status_code
+                outcome.record(status_code, response.headers.get('Retry-After'))
+                if status_code not in RETRY_STATUS_CODES: 
+                    return _read_response(url, response, cache, cached, 
+                            max_bytes, content_types)
+        except Exception as e: 
+            error = e
+
+        kind = classify_error(error, status_code)
+        reason = repr(error) if error is not None else \
+                'status code {}'.format(status_code)
+        if kind == PERMANENT or attempt == MAX_ATTEMPTS: 
+            raise FetchError(url, kind, reason, status_code, attempt)
+        time.sleep(gen_backoff(attempt))
+
+def _read_response(url, response, cache, cached, max_bytes, content_types): 
+    """Read the content of the response (see `get_content`). 
+
+    Args: 
+    ----
+        url: str
+        response: requests.models.Response
+        cache: ResponseCache or None
+        cached: CachedResponse or None
+        max_bytes: int
+        content_types: set of strings, or None
+
+    Returns: 
+    -------
+        content: bytes
+    """
+
+    if cached is not None and response.status_code == 304: 
+        cache.refresh(url)
+        return cached.body
+
+    content_type = response.headers.get('Content-Type')
+    if not is_allowed_content_type(content_type, content_types): 
+        print('Skipping {} URL: {}'.format(content_type, url))
+        return b''
+
+    content, complete = _read_stream(response.iter_content(CHUNK_SIZE), 
+            max_bytes)
+    if not check_response_code(response): 
+        # Check the bad_url to see what happened.
+        print('Bad URL: {}'.format(url))
+    elif not complete: 
+        print('Truncated to {:,} bytes: {}'.format(max_bytes, url))
+    elif cache is not None: 
+        cache.store(url, content, response.headers)
+    return content
+
+def _read_stream(chunks, max_bytes): 
+    """Read the inputted chunks of a body, stopping once past `max_bytes`. 
+
+    Args: 
+    ----
+        chunks: iterable of bytes
+        max_bytes: int
+
+    Returns: 
+    -------
+        content: bytes
+        complete: bool
+            Holds whether the whole body was read. 
+    """
+
+    buffer = bytearray()
+    for chunk in chunks: 
+        buffer.extend(chunk)
+        if len(buffer) > max_bytes: 
+            return bytes(buffer[:max_bytes]), False
+
+    return bytes(buffer), True
+
+def is_allowed_content_type(content_type, content_types): 
+    """Check whether the inputted `Content-Type` header is one we can parse. 
+
+    Args: 
+    ----
+        content_type: str or None
+            Holds the value of the header (e.g. 'text/html; charset=utf-8'). 
+        content_types: set of strings, or None to allow any type. 
+
+    Returns: bool
+    """
+
+    if not content_type or content_types is None: 
+        return True
+
+    return content_type.split(';')[0].strip().lower() in content_types
+
+def get_html(url, parser=DEFAULT_PARSER, parse_only=None): 
     """Issue a get request on the inputted URL and parse the results.  
 
-    Issue a get request on the inputted `url`, and then parse the content using
-    BeautifulSoup. 
+    Issue a get request on the inputted `url` (using the shared session), and 
+    then parse the content using BeautifulSoup. The content is read with 
+    `get_content`, so only HTML (and plain text) pages are parsed, and only up to 
+    `MAX_CONTENT_BYTES` of them. 
+
+    Building the full tree for a page is often the bulk of the work in scraping 
+    it. If only part of the page is needed (e.g. the rows of a page of job 
+    results), pass a `parse_only` strainer so that only the matching tags (and 
+    their contents) are built into the tree, and consider the much faster 'lxml' 
+    parser. 
 
     Args: 
     ----
         url: str
+        parser (optional): str
+            Holds the parser for BeautifulSoup to use - 'html.parser' (pure 
+            Python), 'lxml' (C based, and much faster), or 'html5lib' (slowest, 
+            but parses pages the way a browser does). 
+        parse_only (optional): bs4.SoupStrainer
+            Restricts the tree to the tags that match it (see 
+            `gen_class_strainer`). Not supported by the 'html5lib' parser. 
     
     Returns: 
     ------
         soup: bs4.BeautifulSoup object
     """
 
-    try: 
-        response = requests.get(url)
-        good_response = check_response_code(response)
-        if not good_response: 
-            # Check the bad_url to see what happened.
-            print('Bad URL: {}'.format(url))
-        soup = BeautifulSoup(response.content, 'html.parser')
-        return soup
-    except Exception as e: 
-        print(e)
-        error = "Error in contacting the URL - check that it is a valid URL!"
-        raise RuntimeError(error)
+    content = get_content(url)
+    soup = BeautifulSoup(content, parser, parse_only=parse_only)
+    return soup
+
+def gen_class_strainer(class_name, tag_name=None): 
+    """Build a strainer matching tags with the inputted CSS class. 
+
+    Depending on the version of BeautifulSoup, a strainer checks a tag's classes
+    either one at a time, or as the full `class` attribute (e.g. 'row result'). 
+    A regex matching the class as a whole word works for both. 
+
+    Args: 
+    ----
+        class_name: str
+        tag_name (optional): str
+
+    Returns: 
+    -------
+        strainer: bs4.SoupStrainer
+    """
+
+    class_regex = re.compile(r'(^|\s){}(\s|$)'.format(re.escape(class_name)))
+    return SoupStrainer(tag_name, class_=class_regex)
 
 def check_response_code(response): 
     """Check the response status code. 
@@ -70,3 +394,304 @@ def check_response_code(response):
     else: 
         print("Status code is not 200, it's {}".format(status_code))
         return False
+
+def set_query_param(url, name, value): 
+    """Set a query parameter in the inputted URL, replacing any existing value. 
+
+    Args: 
+    ----
+        url: str
+        name: str
+        value: str or int
+
+    Returns: str
+    """
+
+    parts = urlsplit(url)
+    params = [(param_name, param_value) for param_name, param_value in 
+            parse_qsl(parts.query, keep_blank_values=True) if param_name != name]
+    params.append((name, value))
+    return urlunsplit(parts._replace(query=urlencode(params)))
+
+def normalize_url(url, drop_params=(), keep_params=()): 
+    """Normalize the inputted URL, so that equivalent URLs compare equal. 
+
+    The scheme and host are lowercased, the fragment is dropped, and the query 
+    parameters are sorted. 
+
+    Args: 
+    ----
+        url: str
+        drop_params (optional): iterable
+            Holds query parameters to drop. 
+        keep_params (optional): iterable
+            Holds query parameters that identify the page on their own (e.g. 
+            Indeed's 'jk' job key). If the URL has any of these, every other 
+            query parameter is dropped. 
+
+    Returns: str
+    """
+
+    parts = urlsplit(url.strip())
+    params = parse_qsl(parts.query, keep_blank_values=True)
+    if any(name in keep_params for name, _ in params): 
+        params = [(name, value) for name, value in params if name in keep_params]
+    params = [(name, value) for name, value in params if name not in drop_params]
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), 
+            parts.path or '/', urlencode(sorted(params)), ''))
+
+def normalize_href(href, keep_params=()): 
+    """Normalize the inputted href to a job posting (or other page). 
+
+    Along with the normalization done by `normalize_url`, the scheme is dropped 
+    (sites link to the same posting over both http and https), as are any 
+    tracking parameters (see `TRACKING_PARAMS`). The result can be used as a key 
+    for the page, e.g. to check if it has already been stored. 
+
+    Args: 
+    ----
+        href: str
+        keep_params (optional): iterable
+            See `normalize_url`. 
+
+    Returns: str
+    """
+
+    parts = urlsplit(href.strip())
+    drop_params = TRACKING_PARAMS.union(name for name, _ in 
+            parse_qsl(parts.query, keep_blank_values=True) 
+            if name.startswith('utm_'))
+    normalized = normalize_url(href, drop_params, keep_params)
+    return normalized.split('://', 1)[-1]
+
+def get_response_cache(): 
+    """Return the `ResponseCache` shared by this process. 
+
+    The cache is built lazily at `DEFAULT_CACHE_PATH`, with its default settings. 
+
+    Returns: 
+    -------
+        cache: ResponseCache
+    """
+
+    global _response_cache
+
+    if _response_cache is None: 
+        with _session_lock: 
+            if _response_cache is None: 
+                _response_cache = ResponseCache(DEFAULT_CACHE_PATH)
+
+    return _response_cache
+
+class ResponseCache(object): 
+    """On-disk cache of response bodies, kept between runs. 
+
+    Bodies are stored zlib compressed in a small SQLite database, keyed by the 
+    normalized URL (see `normalize_url`), along with the `ETag` and 
+    `Last-Modified` headers the server sent with them. An entry is fresh for 
+    `ttl` seconds after it was stored (or last revalidated), during which it can 
+    be used without contacting the server at all. After that, it should be 
+    revalidated with the headers from `gen_conditional_headers`, which lets the 
+    server answer with an empty 304 if the body hasn't changed. 
+
+    Once the stored bodies take up more than `max_bytes`, the least recently 
+    used entries are evicted. 
+
+    The cache is only ever an optimization, so an error reading or writing it 
+    (e.g. SQLite's "database is locked", with many processes writing at once) 
+    is printed and otherwise ignored - a failed lookup counts as a miss, and a 
+    failed store or refresh is skipped. A single cache can be shared by the threads of a 
+    process, and multiple processes (e.g. `multiprocessing.Pool` workers) can 
+    point at the same `path` - each opens its own connection to the database. 
+
+    Args: 
+    ----
+        path: str
+            Holds a filepath location for the SQLite database. Created (along 
+            with its directory) if it doesn't exist. 
+        ttl (optional): int
+            Holds the number of seconds an entry is used without revalidating it. 
+        max_bytes (optional): int
+            Holds the maximum number of (compressed) bytes of bodies to keep. 
+    """
+
+    # Number of stores between checks of the size of the cache. 
+    EVICTION_INTERVAL = 100
+
+    # Errors reading or writing the cache, which are ignored (see above). 
+    CACHE_ERRORS = (sqlite3.Error, zlib.error, OSError)
+
+    def __init__(self, path, ttl=6 * 60 * 60, max_bytes=500 * 2 ** 20): 
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+        self._num_stores = 0
+
+    def lookup(self, url): 
+        """Return the cached response for the inputted URL, if there is one. 
+
+        Args: 
+        ----
+            url: str
+
+        Returns: 
+        -------
+            cached: CachedResponse or None
+        """
+
+        key = normalize_url(url)
+        try: 
+            with self._lock: 
+                conn = self._get_conn()
+                row = conn.execute('SELECT body, etag, last_modified, stored_at ' 
+                        'FROM responses WHERE url = ?', (key,)).fetchone()
+                if row is None: 
+                    return None
+                conn.execute('UPDATE responses SET accessed_at = ? WHERE url = ?', 
+                        (time.time(), key))
+
+            body, etag, last_modified, stored_at = row
+            return CachedResponse(zlib.decompress(body), etag, last_modified, 
+                    stored_at)
+        except self.CACHE_ERRORS as e: 
+            print('Error looking up {} in the response cache: {!r}'.format(url, e))
+            return None
+
+    def is_fresh(self, cached): 
+        """Return whether the cached response can be used without revalidating. 
+
+        Args: 
+        ----
+            cached: CachedResponse
+
+        Returns: bool
+        """
+
+        return time.time() - cached.stored_at < self.ttl
+
+    @staticmethod
+    def gen_conditional_headers(cached): 
+        """Generate the headers to revalidate the cached response with. 
+
+        Args: 
+        ----
+            cached: CachedResponse
+
+        Returns: 
+        -------
+            headers: dct
+        """
+
+        headers = {}
+        if cached.etag: 
+            headers['If-None-Match'] = cached.etag
+        if cached.last_modified: 
+            headers['If-Modified-Since'] = cached.last_modified
+
+        return headers
+
+    def store(self, url, body, headers): 
+        """Cache the body of a response for the inputted URL. 
+
+        Args: 
+        ----
+            url: str
+            body: bytes
+            headers: mapping
+                Holds the response headers (e.g. `requests.Response.headers`). 
+        """
+
+        compressed = zlib.compress(body)
+        now = time.time()
+        try: 
+            with self._lock: 
+                conn = self._get_conn()
+                conn.execute('INSERT OR REPLACE INTO responses VALUES ' 
+                        '(?, ?, ?, ?, ?, ?, ?)', (normalize_url(url), compressed, 
+                            headers.get('ETag'), headers.get('Last-Modified'), 
+                            len(compressed), now, now))
+
+                self._num_stores += 1
+                if self._num_stores % self.EVICTION_INTERVAL == 0: 
+                    self._evict(conn)
+        except self.CACHE_ERRORS as e: 
+            print('Error storing {} in the response cache: {!r}'.format(url, e))
+
+    def refresh(self, url): 
+        """Mark the cached response for the inputted URL as just revalidated. 
+
+        Args: 
+        ----
+            url: str
+        """
+
+        now = time.time()
+        try: 
+            with self._lock: 
+                self._get_conn().execute('UPDATE responses SET stored_at = ?, ' 
+                        'accessed_at = ? WHERE url = ?', 
+                        (now, now, normalize_url(url)))
+        except self.CACHE_ERRORS as e: 
+            print('Error refreshing {} in the response cache: {!r}'.format(url, e))
+
+    def _evict(self, conn): 
+        """Evict the least recently used entries until under `max_bytes`. 
+
+        Args: 
+        ----
+            conn: sqlite3.Connection
+        """
+
+        total_bytes = conn.execute( 
+                'SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total_bytes <= self.max_bytes: 
+            return
+
+        # Evict down to 90% of the limit, so we aren't evicting on every check. 
+        excess_bytes = total_bytes - int(self.max_bytes * 0.9)
+        evicted_urls = []
+        for url, size in conn.execute( 
+                'SELECT url, size FROM responses ORDER BY accessed_at'): 
+            evicted_urls.append((url,))
+            excess_bytes -= size
+            if excess_bytes <= 0: 
+                break
+
+        conn.executemany('DELETE FROM responses WHERE url = ?', evicted_urls)
+
+    def _get_conn(self): 
+        """Return this process's connection to the database, opening it if needed. 
+
+        Like the session (see `get_session`), a connection can't safely be shared 
+        across a fork, so a new one is opened in each process. 
+
+        Returns: 
+        -------
+            conn: sqlite3.Connection
+        """
+
+        pid = os.getpid()
+        if self._conn is None or self._conn_pid != pid: 
+            dirname = os.path.dirname(self.path)
+            if dirname: 
+                os.makedirs(dirname, exist_ok=True)
+
+            self._conn = sqlite3.connect(self.path, timeout=30, 
+                    isolation_level=None, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS responses (
+                                      url TEXT PRIMARY KEY,
+                                      body BLOB NOT NULL,
+                                      etag TEXT,
+                                      last_modified TEXT,
+                                      size INTEGER NOT NULL,
+                                      stored_at REAL NOT NULL,
+                                      accessed_at REAL NOT NULL)''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed_at ' 
+                    'ON responses (accessed_at)')
+            self._conn_pid = pid
+
+        return self._conn
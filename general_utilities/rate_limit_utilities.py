@@ -0,0 +1,154 @@
+"""A module to help out with keeping requests under a rate limit.
+
+This module currently provides one class - `RateLimiter` - that implements a
+token bucket, along with an optional daily budget. Its state can optionally be
+kept in a local file, which allows multiple processes to share one rate limit
+(e.g. multiple scrapers running against the same API key). It also provides the
+exception raised when the daily budget has been used up - `RateLimitExceeded`.
+"""
+
+import json
+import os
+import threading
+import time
+import fcntl
+from contextlib import contextmanager
+
+class RateLimitExceeded(Exception): 
+    """Raised when a `RateLimiter` has no budget left for the day."""
+
+class RateLimiter(object): 
+    """Token bucket rate limiter, with an optional daily budget.
+
+    Tokens are added to a bucket at `per_second` tokens per second, up to a
+    maximum of `burst` tokens. Each call to `acquire` removes one token, blocking
+    until one is available. Callers can therefore issue requests as fast as the
+    rate limit allows, rather than sleeping a fixed amount of time between each
+    one.
+
+    If a `state_path` is passed in, the bucket lives in that file (guarded by a
+    file lock) instead of in memory, so that every process pointed at the same
+    file shares a single rate limit and daily budget. The daily budget resets at
+    midnight UTC.
+
+    Args: 
+    ----
+        per_second: float
+        burst (optional): int
+            Holds the maximum number of tokens that can build up in the bucket,
+            i.e. the number of requests that can be issued at once after a lull.
+            Defaults to one second's worth of tokens.
+        per_day (optional): int
+            Holds the maximum number of tokens to hand out in a single day.
+        state_path (optional): str
+    """
+
+    def __init__(self, per_second, burst=None, per_day=None, state_path=None): 
+        self.per_second = per_second
+        self.burst = burst if burst is not None else max(1, per_second)
+        self.per_day = per_day
+        self.state_path = state_path
+        self._lock = threading.Lock()
+        self._state = self._new_state(time.time())
+
+    def acquire(self): 
+        """Take a token from the bucket, blocking until one is available.
+
+        Raises: 
+        ------
+            RateLimitExceeded: if the daily budget has been used up.
+        """
+
+        while True:
+            with self._locked_state() as state:
+                now = time.time()
+                self._refill(state, now)
+                if self.per_day is not None and state['day_count'] >= self.per_day:
+                    raise RateLimitExceeded('Daily budget of {} requests has been '
+                            'used up.'.format(self.per_day))
+                if now >= state['paused_until'] and state['tokens'] >= 1:
+                    state['tokens'] -= 1
+                    state['day_count'] += 1
+                    return
+                wait_time = max(state['paused_until'] - now,
+                        (1 - state['tokens']) / self.per_second)
+            time.sleep(wait_time)
+
+    def pause(self, seconds): 
+        """Empty the bucket and hold off every caller for the inputted seconds.
+
+        Use when a server signals that we're going too fast (e.g. a 429), so that
+        all threads and processes sharing this limiter back off together.
+
+        Args: 
+        ----
+            seconds: float
+        """
+
+        with self._locked_state() as state:
+            now = time.time()
+            self._refill(state, now)
+            state['tokens'] = 0
+            state['paused_until'] = max(state['paused_until'], now + seconds)
+
+    def _new_state(self, now): 
+        """Return the state of a full bucket at the inputted time.
+
+        Args: 
+        ----
+            now: float
+
+        Returns: dct
+        """
+
+        return {'tokens': self.burst, 'last_refill': now, 'paused_until': 0,
+                'day': time.strftime('%Y%m%d', time.gmtime(now)), 'day_count': 0}
+
+    def _refill(self, state, now): 
+        """Add the tokens accrued since the last refill, and roll over the day.
+
+        Args: 
+        ----
+            state: dct
+            now: float
+        """
+
+        elapsed = max(0, now - state['last_refill'])
+        state['tokens'] = min(self.burst,
+                state['tokens'] + elapsed * self.per_second)
+        state['last_refill'] = now
+
+        day = time.strftime('%Y%m%d', time.gmtime(now))
+        if day != state['day']:
+            state['day'] = day
+            state['day_count'] = 0
+
+    @contextmanager
+    def _locked_state(self): 
+        """Yield the limiter's state, holding a lock on it for the duration.
+
+        If there is a `state_path`, the state is read from and written back to
+        that file while holding an exclusive lock on it. Otherwise, the in memory
+        state is used, guarded by a thread lock.
+        """
+
+        if self.state_path is None:
+            with self._lock:
+                yield self._state
+            return
+
+        state_fd = os.open(self.state_path, os.O_RDWR | os.O_CREAT)
+        with self._lock, os.fdopen(state_fd, 'r+') as state_file:
+            fcntl.flock(state_file, fcntl.LOCK_EX)
+            try:
+                state_file.seek(0)
+                contents = state_file.read()
+                state = json.loads(contents) if contents else \
+                        self._new_state(time.time())
+                yield state
+                state_file.seek(0)
+                state_file.truncate()
+                json.dump(state, state_file)
+                state_file.flush()
+            finally:
+                fcntl.flock(state_file, fcntl.LOCK_UN)
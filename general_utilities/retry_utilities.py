@@ -0,0 +1,94 @@
+"""A module to help out with retrying failed requests, and recording failures.
+
+This module currently provides the exception raised when fetching a URL fails
+for good - `FetchError` - along with helper functions to classify an error
+(`classify_error`) and to space out retries (`gen_backoff`). URLs that still
+fail after retrying can be recorded for a later re-crawl with
+`storage_utilities.record_dead_letter`.
+"""
+
+import asyncio
+import random
+import requests
+import aiohttp
+
+# Kinds of errors - transient errors (e.g. a timeout, or a 503) are worth
+# retrying, and permanent errors (e.g. an invalid URL) are not.
+TRANSIENT = 'transient'
+PERMANENT = 'permanent'
+
+# Status codes that are worth retrying.
+RETRY_STATUS_CODES = frozenset([408, 429, 500, 502, 503, 504])
+
+# Number of attempts made at a URL before giving up on it, and the settings
+# used to space those attempts out (see `gen_backoff`).
+MAX_ATTEMPTS = 3
+BACKOFF_BASE = 1
+BACKOFF_CAP = 30
+
+class FetchError(RuntimeError): 
+    """Raised when a URL could not be fetched, after any retries.
+
+    Args: 
+    ----
+        url: str
+        kind: str
+            Holds `TRANSIENT` or `PERMANENT` (see `classify_error`).
+        reason: str
+        status_code (optional): int
+        attempts (optional): int
+    """
+
+    def __init__(self, url, kind, reason, status_code=None, attempts=1): 
+        message = 'Failed to fetch {} after {} attempt(s) ({}): {}'.format(url,
+                attempts, kind, reason)
+        super(FetchError, self).__init__(message)
+        self.url = url
+        self.kind = kind
+        self.reason = reason
+        self.status_code = status_code
+        self.attempts = attempts
+
+def classify_error(error=None, status_code=None): 
+    """Classify a failed request as `TRANSIENT` or `PERMANENT`.
+
+    Args: 
+    ----
+        error (optional): Exception
+            Holds the exception the request raised, if any.
+        status_code (optional): int
+            Holds the status code of the response, if there was one.
+
+    Returns: str
+    """
+
+    if status_code is not None:
+        return TRANSIENT if status_code in RETRY_STATUS_CODES else PERMANENT
+
+    transient_errors = (requests.ConnectionError, requests.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+            aiohttp.ClientConnectionError, aiohttp.ClientPayloadError,
+            asyncio.TimeoutError, ConnectionError, TimeoutError)
+    if isinstance(error, transient_errors):
+        return TRANSIENT
+
+    return PERMANENT
+
+def gen_backoff(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP): 
+    """Return the number of seconds to wait before retrying.
+
+    This uses "full jitter" - a random wait between zero and an exponentially
+    growing (but capped) maximum - so that requests that failed together don't
+    all retry together.
+
+    Args: 
+    ----
+        attempt: int
+            Holds the number of attempts made so far.
+        base (optional): float
+        cap (optional): float
+
+    Returns: float
+    """
+
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
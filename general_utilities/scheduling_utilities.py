@@ -0,0 +1,281 @@
+"""A module to help out with being polite to the hosts we scrape.
+
+This module currently provides one class - `HostScheduler` - that every request
+to a host goes through, along with a helper function to get the scheduler shared
+by a process - `get_host_scheduler`. The scheduler keeps a limit on how many
+requests can be in flight against each host at once, and how quickly they can be
+issued, and adapts the concurrency limit to how the host is responding.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+from urllib.parse import urlsplit
+
+# Status codes that a host uses to tell us we're going too fast.
+THROTTLE_STATUS_CODES = frozenset([429, 503])
+
+_scheduler = None
+_scheduler_pid = None
+_scheduler_lock = threading.Lock()
+
+class HostScheduler(object): 
+    """Per-host concurrency and rate limits, adapted AIMD style.
+
+    Each host gets its own concurrency limit, which starts at
+    `initial_concurrency`. Every healthy response raises it additively (by about
+    one per limit's worth of responses), and every sign of congestion cuts it in
+    half (multiplicative decrease), the same way TCP finds the capacity of a
+    link. The signs of congestion are a 429 or 503 (which also pause the host for
+    its `Retry-After`, or `backoff` seconds), a request that fails outright, and
+    a response that takes more than `latency_factor` times as long as the host's
+    recent average. Decreases are spaced out by at least a second, so a burst of
+    slow responses only counts once.
+
+    On top of this, requests against a host are spaced out to no more than
+    `per_second` a second.
+
+    A single scheduler can be shared by the threads of a process (see `slot`)
+    and by the coroutines of an event loop (see `async_slot`).
+
+    Args: 
+    ----
+        initial_concurrency (optional): int
+        min_concurrency (optional): int
+        max_concurrency (optional): int
+        per_second (optional): float
+            Holds the maximum number of requests to issue to a host a second.
+        latency_factor (optional): float
+        backoff (optional): float
+            Holds the number of seconds to pause a host for when it throttles us
+            without saying for how long.
+    """
+
+    # Seconds between checks for a free slot, when waiting from a coroutine.
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, initial_concurrency=4, min_concurrency=1,
+            max_concurrency=16, per_second=10, latency_factor=3, backoff=30): 
+        self.initial_concurrency = initial_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.per_second = per_second
+        self.latency_factor = latency_factor
+        self.backoff = backoff
+        self._hosts = {}
+        self._condition = threading.Condition()
+
+    def concurrency(self, host): 
+        """Return the current concurrency limit for the inputted host.
+
+        Args: 
+        ----
+            host: str
+
+        Returns: int
+        """
+
+        with self._condition:
+            return int(self._get_host(host)['limit'])
+
+    @contextmanager
+    def slot(self, url): 
+        """Hold a slot for a request to the URL's host, blocking until one's free.
+
+        Yields a `RequestOutcome`, which the caller should `record` the response
+        on. A request that raises an exception counts as a failure.
+
+        Args: 
+        ----
+            url: str
+        """
+
+        host = urlsplit(url).netloc
+        with self._condition:
+            while True:
+                wait_time = self._try_acquire(host)
+                if wait_time == 0:
+                    break
+                self._condition.wait(wait_time)
+
+        outcome = RequestOutcome()
+        start_time = time.monotonic()
+        try:
+            yield outcome
+        except:
+            self.release(host, failed=True)
+            raise
+        self.release(host, outcome, time.monotonic() - start_time)
+
+    @asynccontextmanager
+    async def async_slot(self, url): 
+        """Hold a slot for a request to the URL's host, from within a coroutine.
+
+        See `slot`.
+
+        Args: 
+        ----
+            url: str
+        """
+
+        host = urlsplit(url).netloc
+        while True:
+            with self._condition:
+                wait_time = self._try_acquire(host)
+            if wait_time == 0:
+                break
+            await asyncio.sleep(wait_time or self.POLL_INTERVAL)
+
+        outcome = RequestOutcome()
+        start_time = time.monotonic()
+        try:
+            yield outcome
+        except:
+            self.release(host, failed=True)
+            raise
+        self.release(host, outcome, time.monotonic() - start_time)
+
+    def release(self, host, outcome=None, latency=None, failed=False): 
+        """Give back the slot for a request, and adapt the host's limit.
+
+        Args: 
+        ----
+            host: str
+            outcome (optional): RequestOutcome
+            latency (optional): float
+            failed (optional): bool
+                Whether the request failed outright (e.g. a connection error).
+        """
+
+        now = time.monotonic()
+        with self._condition:
+            state = self._get_host(host)
+            state['in_flight'] -= 1
+
+            status_code = outcome.status_code if outcome is not None else None
+            if failed or status_code in THROTTLE_STATUS_CODES:
+                self._decrease(state, now)
+                if status_code in THROTTLE_STATUS_CODES:
+                    pause = outcome.retry_after if outcome.retry_after \
+                            is not None else self.backoff
+                    state['paused_until'] = max(state['paused_until'],
+                            now + pause)
+            elif status_code is not None and latency is not None:
+                average_latency = state['latency']
+                if average_latency is not None and \
+                        latency > self.latency_factor * average_latency:
+                    self._decrease(state, now)
+                else:
+                    state['limit'] = min(self.max_concurrency,
+                            state['limit'] + 1 / state['limit'])
+                state['latency'] = latency if average_latency is None else \
+                        0.8 * average_latency + 0.2 * latency
+
+            self._condition.notify_all()
+
+    def _decrease(self, state, now): 
+        """Cut the host's concurrency limit in half, unless it was just cut.
+
+        Args: 
+        ----
+            state: dct
+            now: float
+        """
+
+        if now - state['last_decrease'] >= 1:
+            state['limit'] = max(self.min_concurrency, state['limit'] / 2)
+            state['last_decrease'] = now
+
+    def _try_acquire(self, host): 
+        """Take a slot for the host if one is free (holding `_condition`).
+
+        Args: 
+        ----
+            host: str
+
+        Returns: 
+        -------
+            wait_time: float or None
+                Holds 0 if a slot was taken. Otherwise, holds the number of
+                seconds until one might be free, or None if that depends on
+                another request finishing.
+        """
+
+        state = self._get_host(host)
+        now = time.monotonic()
+        if now < state['paused_until']:
+            return state['paused_until'] - now
+        if state['in_flight'] >= int(state['limit']):
+            return None
+        if now < state['next_request']:
+            return state['next_request'] - now
+
+        state['in_flight'] += 1
+        state['next_request'] = now + 1 / self.per_second
+        return 0
+
+    def _get_host(self, host): 
+        """Return the state of the inputted host, creating it if needed.
+
+        Args: 
+        ----
+            host: str
+
+        Returns: dct
+        """
+
+        if host not in self._hosts:
+            self._hosts[host] = {'limit': float(self.initial_concurrency),
+                    'in_flight': 0, 'next_request': 0, 'paused_until': 0,
+                    'last_decrease': 0, 'latency': None}
+
+        return self._hosts[host]
+
+class RequestOutcome(object): 
+    """How a request held in a `HostScheduler` slot turned out."""
+
+    def __init__(self): 
+        self.status_code = None
+        self.retry_after = None
+
+    def record(self, status_code, retry_after=None): 
+        """Record the response to the request.
+
+        Args: 
+        ----
+            status_code: int
+            retry_after (optional): str
+                Holds the value of the response's `Retry-After` header, if any.
+                Only a number of seconds is understood.
+        """
+
+        self.status_code = status_code
+        try:
+            self.retry_after = float(retry_after)
+        except (TypeError, ValueError):
+            self.retry_after = None
+
+def get_host_scheduler(): 
+    """Return the `HostScheduler` shared by this process.
+
+    Like the session in `query_utilities.get_session`, the scheduler is built
+    lazily, and rebuilt if we find ourselves in a different process than the one
+    that built it (its lock can't safely be shared across a fork).
+
+    Returns: 
+    -------
+        scheduler: HostScheduler
+    """
+
+    global _scheduler, _scheduler_pid
+
+    pid = os.getpid()
+    if _scheduler is None or _scheduler_pid != pid:
+        with _scheduler_lock:
+            if _scheduler is None or _scheduler_pid != pid:
+                _scheduler = HostScheduler()
+                _scheduler_pid = pid
+
+    return _scheduler
@@ -1,11 +1,61 @@
 """A module to help out with storing web scraping info. 
 
-This module currently provides a couple of helper functions for storing scraping results in mongo. Only one is meant to be called directly - `store_in_mongo`. 
+This module currently provides a couple of helper functions for storing scraping
+results in mongo, along with a class for buffering those results - 
+`BufferedMongoWriter`. The pieces meant to be called directly are 
+`store_in_mongo`, `get_buffered_writer`, `flush_buffered_writers`, and (to check 
+what has already been stored before scraping it again) `find_stored_keys` and 
+`filter_unstored`, and (to keep track of URLs that couldn't be fetched, so they 
+can be re-crawled on their own) `record_dead_letter`, `load_dead_letters`, and 
+`remove_dead_letter`. 
+
+All of these share a single `MongoClient` per process (see `get_mongo_client`), 
+rather than opening and closing a new client on each store. 
 """
 
-from pymongo import MongoClient
+import atexit
+import os
+import threading
+import time
+from multiprocessing import util as mp_util
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError
+
+# Mongo database holding the dead letter collections (one per site). 
+DEAD_LETTER_DB = 'dead_letters'
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+_writers = {}
+_writers_pid = None
+_writers_lock = threading.Lock()
 
-def store_in_mongo(lst_of_dcts, db_name, collection_name, key=None): 
+def get_mongo_client(): 
+    """Return the `MongoClient` shared by this process. 
+
+    The client is built lazily, and rebuilt if we find ourselves in a different 
+    process than the one that built it (`MongoClient` is not fork-safe). 
+
+    Returns: 
+    -------
+        client: MongoClient
+    """
+
+    global _client, _client_pid
+
+    pid = os.getpid()
+    if _client is None or _client_pid != pid: 
+        with _client_lock: 
+            if _client is None or _client_pid != pid: 
+                _client = MongoClient()
+                _client_pid = pid
+
+    return _client
+
+def store_in_mongo(lst_of_dcts, db_name, collection_name, key=None, 
+        upsert=False): 
     """Store the list of dictionaries in Mongo. 
 
     Store the `lst_of_dcts` in Mongo, by an inputted `key` if passed in. 
@@ -18,43 +68,302 @@ def store_in_mongo(lst_of_dcts, db_name, collection_name, key=None):
         key (optional): str
             Key to use to line up the dictionaries with a particular document that
             may already exist in Mongo. 
+        upsert (optional): bool
+            Only used if a `key` is passed in. Whether or not to insert a new 
+            document for dictionaries that don't line up with an existing one. 
     """
     
-    client = MongoClient()
+    client = get_mongo_client()
     db = client[db_name]
     collection = db[collection_name]
     
     if key is not None: 
-        _store_in_mongo_by_key(lst_of_dcts, collection, key)
+        _store_in_mongo_by_key(lst_of_dcts, collection, key, upsert)
     else: 
         # Check if the length is one, in which case we need to use insert_one. 
         # Otherwise, make sure that it's not empty (i.e. the `elif` statement) 
-        # below, and then insert many. If it's empty, don't do anything and close
-        # the client. 
+        # below, and then insert many. If it's empty, don't do anything. 
         if len(lst_of_dcts) == 1: 
             collection.insert_one(lst_of_dcts[0])
         elif lst_of_dcts: 
             collection.insert_many(lst_of_dcts)
 
-    client.close()
-
-def _store_in_mongo_by_key(lst_of_dcts, mongo_client, key):
+def _store_in_mongo_by_key(lst_of_dcts, collection, key, upsert=False, 
+        batch_size=1000): 
     """Store the list of dictionaries in Mongo, by key. 
 
     This is a helper function to `store_in_mongo` that is used to line up each
     dictionary that is being inserted into Mongo with an already existent document
     in the Mongo collection. Use the inputted `key` parameter to do so. 
 
+    Each dictionary becomes a single `$set` of all of its fields, and these are 
+    sent in unordered `bulk_write` batches of `batch_size`. An index is ensured 
+    on the `key` so that each update can find its document without a full 
+    collection scan. 
+
     Args: 
     ----
         lst_of_dcts: list of dictionaries
-        mongo_client: MongoClient()
+        collection: pymongo.collection.Collection
         key: str
+        upsert (optional): bool
+        batch_size (optional): int
     """ 
 
+    if not lst_of_dcts: 
+        return
+
+    collection.create_index(key)
+    updates = [UpdateOne({key: dct[key]}, {'$set': dct}, upsert=upsert) for 
+            dct in lst_of_dcts]
+    for batch_start in range(0, len(updates), batch_size): 
+        batch = updates[batch_start:batch_start + batch_size]
+        collection.bulk_write(batch, ordered=False)
+
+def find_stored_keys(keys, db_name, collection_name, key, batch_size=1000): 
+    """Return which of the inputted keys are already stored in Mongo. 
+
+    The keys are looked up with one `$in` query per `batch_size` keys, against 
+    an index on the `key` field (ensured here), and only the `key` field of each 
+    matching document is sent back. 
+
+    Args: 
+    ----
+        keys: iterable of strings
+        db_name: str
+        collection_name: str
+        key: str
+            Holds the name of the field to look the keys up in. 
+        batch_size (optional): int
+
+    Returns: 
+    -------
+        stored_keys: set
+    """
+
+    keys = list(set(k for k in keys if k))
+    stored_keys = set()
+    if not keys: 
+        return stored_keys
+
+    collection = get_mongo_client()[db_name][collection_name]
+    collection.create_index(key)
+    for batch_start in range(0, len(keys), batch_size): 
+        batch = keys[batch_start:batch_start + batch_size]
+        cursor = collection.find({key: {'$in': batch}}, {key: True, '_id': False})
+        stored_keys.update(document[key] for document in cursor)
+
+    return stored_keys
+
+def filter_unstored(lst_of_dcts, db_name, collection_name, key): 
+    """Drop the dictionaries whose `key` is already stored in Mongo. 
+
+    Dictionaries that repeat a `key` earlier in the list are dropped as well. 
+
+    Args: 
+    ----
+        lst_of_dcts: list of dictionaries
+        db_name: str
+        collection_name: str
+        key: str
+
+    Returns: 
+    -------
+        unstored_dcts: list of dictionaries
+    """
+
+    seen_keys = find_stored_keys((dct.get(key) for dct in lst_of_dcts), 
+            db_name, collection_name, key)
+    unstored_dcts = []
     for dct in lst_of_dcts: 
-        key_value = dct[key]
-        # Not the most efficient way, but this allows it to be really general. 
-        for k, v in dct.items():
-            res = mongo_client.find({key: key_value})
-            mongo_client.update_one({key: key_value}, {'$set': {k :v}})
+        dct_key = dct.get(key)
+        if dct_key and dct_key in seen_keys: 
+            continue
+        seen_keys.add(dct_key)
+        unstored_dcts.append(dct)
+
+    return unstored_dcts
+
+class BufferedMongoWriter(object): 
+    """Buffer documents and insert them into Mongo in large, unordered batches. 
+
+    Documents passed to `write` accumulate in memory until either `batch_size` 
+    documents are buffered or `flush_interval` seconds have passed since the last 
+    flush, at which point they are all sent with a single unordered `insert_many`. 
+    An unordered insert lets the server apply the batch in parallel, and a failure 
+    on one document doesn't stop the rest from being inserted. 
+
+    Rather than building these directly, use `get_buffered_writer`, which hands 
+    back one writer per collection per process and ensures that it is flushed 
+    when the process exits. 
+
+    Args: 
+    ----
+        db_name: str
+        collection_name: str
+        batch_size (optional): int
+            Holds the number of buffered documents that triggers a flush. 
+        flush_interval (optional): int
+            Holds the number of seconds after which a write triggers a flush, 
+            regardless of how many documents are buffered. 
+    """
+
+    def __init__(self, db_name, collection_name, batch_size=500, 
+            flush_interval=30): 
+        self.db_name = db_name
+        self.collection_name = collection_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.last_flush = time.time()
+        self._lock = threading.Lock()
+
+    def write(self, lst_of_dcts): 
+        """Add the list of dictionaries to the buffer, flushing if necessary. 
+
+        Args: 
+        ----
+            lst_of_dcts: list of dictionaries
+        """
+
+        with self._lock: 
+            self.buffer.extend(lst_of_dcts)
+            flush_due = (len(self.buffer) >= self.batch_size or 
+                    time.time() - self.last_flush >= self.flush_interval)
+
+        if flush_due: 
+            self.flush()
+
+    def flush(self): 
+        """Insert all of the buffered documents into Mongo."""
+
+        with self._lock: 
+            docs, self.buffer = self.buffer, []
+            self.last_flush = time.time()
+
+        if docs: 
+            collection = get_mongo_client()[self.db_name][self.collection_name]
+            try: 
+                collection.insert_many(docs, ordered=False)
+            except BulkWriteError as e: 
+                num_errors = len(e.details.get('writeErrors', []))
+                print('{} of {} documents failed to insert into {}.{}'.format(
+                    num_errors, len(docs), self.db_name, self.collection_name))
+
+def get_buffered_writer(db_name, collection_name, **writer_kwargs): 
+    """Return this process's `BufferedMongoWriter` for the inputted collection. 
+
+    The first writer built in a process also registers `flush_buffered_writers` 
+    to run when that process exits. This covers both the main process (via 
+    `atexit`) and `multiprocessing.Pool` workers that are shut down with 
+    `pool.close()` and `pool.join()` (via `multiprocessing`'s own exit hooks, 
+    since `atexit` handlers aren't run in worker processes). 
+
+    Args: 
+    ----
+        db_name: str
+        collection_name: str
+        **writer_kwargs: 
+            Passed on to the `BufferedMongoWriter` constructor if the writer 
+            doesn't exist yet. 
+
+    Returns: 
+    -------
+        writer: BufferedMongoWriter
+    """
+
+    global _writers, _writers_pid
+
+    with _writers_lock: 
+        pid = os.getpid()
+        if _writers_pid != pid: 
+            # Any writers we see here were copied from a parent process when it 
+            # forked - their buffers will be flushed by that parent. 
+            _writers = {}
+            _writers_pid = pid
+            atexit.register(flush_buffered_writers)
+            mp_util.Finalize(None, flush_buffered_writers, exitpriority=10)
+
+        writer_key = (db_name, collection_name)
+        if writer_key not in _writers: 
+            _writers[writer_key] = BufferedMongoWriter(db_name, collection_name, 
+                    **writer_kwargs)
+
+        return _writers[writer_key]
+
+def flush_buffered_writers(): 
+    """Flush every `BufferedMongoWriter` built in this process."""
+
+    if _writers_pid != os.getpid(): 
+        return
+
+    for writer in list(_writers.values()): 
+        writer.flush()
+
+def record_dead_letter(error, collection_name, document=None, page_task=None,
+        search=None): 
+    """Record a URL that could not be fetched, so it can be re-crawled later.
+
+    Dead letters are keyed by URL, so recording the same URL again updates its
+    entry (and counts the failure) rather than adding a second one.
+
+    Args: 
+    ----
+        error: retry_utilities.FetchError
+        collection_name: str
+            Holds the name of the dead letter collection (e.g. the site name).
+        document (optional): dct
+            Holds the document that was being filled in with the URL's content
+            (e.g. a job posting, missing its `posting_txt`).
+        page_task (optional): tuple
+            Holds the arguments to re-scrape the page the URL is for with.
+        search (optional): tuple
+            Holds the search to re-query, if the URL is for the first page of a
+            search's results.
+    """
+
+    collection = get_mongo_client()[DEAD_LETTER_DB][collection_name]
+    collection.create_index('url', unique=True)
+    dead_letter = {'kind': error.kind, 'reason': error.reason,
+            'status_code': error.status_code, 'updated_at': time.time(),
+            'document': document,
+            'page_task': list(page_task) if page_task is not None else None,
+            'search': list(search) if search is not None else None}
+    collection.update_one({'url': error.url}, {'$set': dead_letter,
+        '$inc': {'num_failures': 1}}, upsert=True)
+
+def load_dead_letters(collection_name, max_failures=5): 
+    """Return the dead letters that are still worth re-crawling.
+
+    Args: 
+    ----
+        collection_name: str
+        max_failures (optional): int
+            Dead letters that have failed this many times are left out.
+
+    Returns: 
+    -------
+        dead_letters: list of dictionaries
+    """
+
+    collection = get_mongo_client()[DEAD_LETTER_DB][collection_name]
+    query = {'num_failures': {'$lt': max_failures}}
+    return list(collection.find(query, {'_id': False}))
+
+def remove_dead_letter(dead_letter, collection_name): 
+    """Remove the inputted dead letter, unless it has failed again since loading.
+
+    Args: 
+    ----
+        dead_letter: dct
+            Holds a dead letter returned by `load_dead_letters`.
+        collection_name: str
+
+    Returns: bool
+        Whether the dead letter was removed.
+    """
+
+    collection = get_mongo_client()[DEAD_LETTER_DB][collection_name]
+    result = collection.delete_one({'url': dead_letter['url'],
+        'updated_at': dead_letter['updated_at']})
+    return result.deleted_count == 1
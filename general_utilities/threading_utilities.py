@@ -6,19 +6,21 @@ for each thread. It does this by storing the results of the get request as an
 attribute on the class. 
 """
 from threading import Thread
-from general_utilities.query_utilities import get_html
-from general_utilities.parsing_utilities import find_visible_texts
+from general_utilities.query_utilities import get_content, get_response_cache
+from general_utilities.parsing_utilities import extract_visible_text
+from general_utilities.retry_utilities import FetchError
 
 class HrefQueryThread(Thread): 
     """Threading based class to issue a get request and store the results.  
     
-    HrefQueryThread issues a get request on an inputted URL, parses the results 
-    using BeautifulSoup, and then stores the results as an attribute available 
+    HrefQueryThread issues a get request on an inputted URL, parses the visible 
+    text out of the results, and then stores the results as an attribute available 
     for later access. Motivation for using a class instead of simply passing a
     function to ThreadPool was to avoid creating a new connection with the database   
     (here Mongo) for each get request (this would most likely overwhelm the comp 
     with thread). HrefQueryThread allows for later access of the results of the 
-    get request in order to perform multiple uploads/updates to the db. 
+    get request in order to perform multiple uploads/updates to the db. If the 
+    get request fails, `posting_txt` is None and `error` holds the `FetchError`. 
 
     Args: 
     ----
@@ -31,8 +33,13 @@ class HrefQueryThread(Thread):
         self.href = href
 
     def run(self): 
+        self.error = None
         if self.href: 
-            self.posting_txt = self._query_href()
+            try: 
+                self.posting_txt = self._query_href()
+            except FetchError as e: 
+                self.posting_txt = None
+                self.error = e
         else: 
             self.posting_txt = ''
 
@@ -40,15 +47,11 @@ class HrefQueryThread(Thread):
         """Grab the text from the href. 
 
         Returns: str of visible text from the href. 
-        """
-        try:
-            soup = get_html(self.href)
-
-            texts = soup.findAll(text=True)
-            visible_texts = filter(find_visible_texts, texts)
-        except Exception as e: 
-            print(e)
-            visible_texts = ['SSLError', 'happened']
 
-        return ' '.join(visible_texts)
+        Raises: 
+        ------
+            FetchError: if the href couldn't be fetched. 
+        """
 
+        content = get_content(self.href, cache=get_response_cache())
+        return extract_visible_text(content)
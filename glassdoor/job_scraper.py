@@ -7,18 +7,26 @@ the entire process. It also handles parsing and storing our results.
 Usage: 
 
     python job_scraper.py <job title> <job location>
+    python job_scraper.py --batch <searches CSV>
 """
 import sys
 import os
 wd = os.path.abspath('.')
 sys.path.append(wd + '/../')
-import random
-import time
 import datetime
 import pytz
-from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.keys import Keys
-from general_utilities.navigation_utilities import issue_driver_query
+from selenium.webdriver.common.by import By
+from bs4 import BeautifulSoup
+from general_utilities.navigation_utilities import (issue_driver_query, 
+        run_browser_searches, wait_for, wait_for_element, wait_for_new_page, 
+        jitter, gen_session_kwargs)
+from general_utilities.async_utilities import fetch_all
+from general_utilities.query_utilities import (get_response_cache, 
+        gen_class_strainer, DEFAULT_PARSER)
+from general_utilities.retry_utilities import FetchError
+from general_utilities.batch_utilities import read_searches
 from general_utilities.parsing_utilities import parse_num
 from general_utilities.storage_utilities import store_in_mongo
 
@@ -30,6 +38,10 @@ def scrape_job_page(driver, job_title, job_location):
     job location, posting company, date posted, and any stars assigned 
     (if any). Parse the relevant information, and then store it. 
 
+    The text of each posting is fetched over plain HTTP (as the browser, so 
+    with its cookies), for every posting on the page at once. Only postings 
+    whose text can't be fetched that way are clicked through to. 
+
     Args: 
         driver: Selenium webdriver
         job_title: str
@@ -41,29 +53,34 @@ def scrape_job_page(driver, job_title, job_location):
             'search_location': job_location, \
             'search_date': current_date, 'job_site': 'glassdoor'}
 
-    jobs = driver.find_elements_by_class_name('jobListing')
+    jobs = driver.find_elements_by_class_name('jobListing')[:-1]
+
+    mongo_update_lst = [query_for_data(json_dct, job) for job in jobs]
 
-    mongo_update_lst = [query_for_data(driver, json_dct, job, idx) for 
-            idx, job in enumerate(jobs[:-1])]
+    hrefs = [grab_posting_href(job) for job in jobs]
+    contents = fetch_all(hrefs, cache=get_response_cache(), 
+            **gen_session_kwargs(driver))
+    for job, mongo_dct, content in zip(jobs, mongo_update_lst, contents): 
+        posting_txt = parse_posting_txt(content)
+        if not posting_txt: 
+            posting_txt = grab_posting_txt(driver, job)
+        mongo_dct['posting_txt'] = posting_txt
 
     store_in_mongo(mongo_update_lst, 'job_postings', 'glassdoor')
 
-def query_for_data(driver, json_dct, job, idx): 
+def query_for_data(json_dct, job): 
     """Grab all info. from the job posting
     
     This will include the job title, the job location, the 
     posting company, the date posted, and then any stars assigned. 
-    After grabbing this information, click and get the job posting's
-    actual text. 
+    The job posting's actual text is grabbed separately (see 
+    `scrape_job_page`). 
 
     Args: 
-        driver: Selenium webdriver
         json_dct: dict 
             Dictionary holding the current information that is being stored
             for that job posting. 
         job: Selenium WebElement
-        idx: int
-            Holds the # of the job posting the program is on (0 indexed here). 
 
     Return: dct
     """
@@ -93,8 +110,7 @@ def query_for_data(driver, json_dct, job, idx):
         posting_company = ' '.join(split_posting_company)
         out_json_dct = gen_output(json_dct.copy(), posting_title, 
                 posting_location, posting_date, posting_company)
-    
-    out_json_dct['posting_txt'] = grab_posting_txt(driver, job, idx)
+
     return out_json_dct
     
 def gen_output(json_dct, *args): 
@@ -122,18 +138,60 @@ def gen_output(json_dct, *args):
 
     return json_dct
 
-def grab_posting_txt(driver, job, idx): 
-    """Grab the job posting's actual text. 
+def grab_posting_href(job): 
+    """Grab the URL of the job posting. 
+
+    Args: 
+        job: Selenium WebElement
+
+    Return: str
+    """
+
+    try: 
+        return job.find_element_by_class_name('jobLink').get_attribute('href')
+    except: 
+        return ''
+
+def parse_posting_txt(content): 
+    """Grab the job posting's text from the content of its page. 
+
+    Args: 
+        content: bytes, FetchError, or None
+            Holds the body of the response for the job posting, the error 
+            fetching it, or None if there was no href to request it from. 
+
+    Return: str (posting text, or '' if it couldn't be found)
+    """
+
+    if content is None or isinstance(content, FetchError): 
+        return ''
+
+    soup = BeautifulSoup(content, DEFAULT_PARSER, 
+            parse_only=gen_class_strainer('jobDescriptionContent'))
+    return soup.get_text('\n', strip=True)
+
+def grab_posting_txt(driver, job): 
+    """Grab the job posting's actual text by clicking through to it. 
+
+    Click through to the posting, and wait for its text to show up. This is 
+    the slow path, for postings whose text couldn't be fetched directly. 
+
+    Only some postings on a page are clicked through to, so the posting's 
+    description panel can't be found by its position on the page. Instead, 
+    wait for the most recently opened panel to be new (or to have changed). 
 
     Args: 
         driver: Selenium webdriver
         job: Selenium WebElement
             Holds a reference to the current job the program is on. 
-        idx: int
     
     Return: str (posting text)
     """
 
+    old_texts = driver.find_elements_by_class_name('jobDescriptionContent')
+    num_old_texts = len(old_texts)
+    old_posting_txt = old_texts[-1].text if old_texts else ''
+
     job_link = job.find_element_by_class_name('jobLink')
     job_link.send_keys(Keys.ENTER)
     job_link.send_keys(Keys.ESCAPE)
@@ -143,14 +201,28 @@ def grab_posting_txt(driver, job, idx):
     except: 
         pass
 
-    time.sleep(random.randint(3, 7))
-    texts = driver.find_elements_by_class_name('jobDescriptionContent')
+    def posting_txt_loaded(driver): 
+        texts = driver.find_elements_by_class_name('jobDescriptionContent')
+        if not texts: 
+            return False
+        posting_txt = texts[-1].text
+        is_new = len(texts) > num_old_texts or posting_txt != old_posting_txt
+        return is_new and posting_txt
+
+    try: 
+        posting_txt = wait_for(driver, posting_txt_loaded)
+    except TimeoutException: 
+        print('Timed out waiting for posting text in Glassdoor!')
+        return ''
+    jitter(5)
 
-    return texts[idx].text
+    return posting_txt
 
 def check_if_next(driver, num_pages): 
     """Check if there is a next page of job results to grab. 
 
+    If so, click through to it, and wait for it to load. 
+
     Args: 
         driver: Selenium webdriver 
         num_pages: int
@@ -166,8 +238,10 @@ def check_if_next(driver, num_pages):
         last_page = check_if_last_page(page_links, num_pages)
         if last_page:  
             return False
-        time.sleep(random.randint(3, 6))
+        first_job = driver.find_element_by_class_name('jobListing')
+        jitter(5)
         next_link.click()
+        wait_for_new_page(driver, first_job)
         return True
     except Exception as e:
         print(e)
@@ -196,21 +270,26 @@ def check_if_last_page(page_links, num_pages):
         elif elem2_text: 
             return int(elem2_text) == num_pages
 
-if __name__ == '__main__':
-    try: 
-        job_title = sys.argv[1]
-        job_location = sys.argv[2]
-    except IndexError: 
-        raise Exception('Program needs a job title and job location inputted!')
-    
+def scrape_search(driver, job_title, job_location): 
+    """Run a single search on Glassdoor, and scrape every page of its results. 
+
+    Args: 
+        driver: Selenium webdriver
+            Holds the browser to run the search in (e.g. one from a 
+            `BrowserPool`). 
+        job_title: str
+        job_location: str
+    """
+
     # Issue the job query. 
     base_URL = 'https://www.glassdoor.com/index.htm'
     query_params = (('KeywordSearch', job_title), ('LocationSearch', job_location))
-    driver = issue_driver_query(base_URL, query_params)
+    issue_driver_query(base_URL, query_params, driver=driver)
 
-    # Find the text holding the number of jobs, and parse it. 
-    time.sleep(random.randint(7, 15))
-    num_jobs_txt = driver.find_elements_by_xpath('//header')[1].text
+    # Wait for the text holding the number of jobs, and parse it. 
+    headers = wait_for(driver, 
+            lambda driver: driver.find_elements_by_xpath('//header')[1:])
+    num_jobs_txt = headers[0].text
     num_jobs = int(parse_num(num_jobs_txt, 0)) 
 
     current_date = str(datetime.datetime.now(pytz.timezone('US/Mountain')))
@@ -219,20 +298,31 @@ if __name__ == '__main__':
     store_in_mongo([storage_dct], 'job_numbers', 'glassdoor')
 
     # Find the text holding the number of pages in the job search. 
-    time.sleep(random.randint(2, 6))
     try: 
-        num_pages_txt = driver.find_element_by_id('ResultsFooter').text
+        num_pages_txt = wait_for_element(driver, (By.ID, 'ResultsFooter')).text
         num_pages = int(parse_num(num_pages_txt, 1))
     except: 
         print('No jobs for search {} in {}'.format(job_title, job_location))
-        sys.exit(0)
+        return
     
     # Give it a little time before starting to click and parse
-    time.sleep(random.randint(6, 12))
+    jitter(10)
 
     is_next = True
     while is_next: 
-        jobs = scrape_job_page(driver, job_title, job_location)
-        time.sleep(random.randint(5, 8))
+        scrape_job_page(driver, job_title, job_location)
+        jitter(5)
         is_next = check_if_next(driver, num_pages)
-    driver.close()
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == '--batch': 
+        searches = read_searches(sys.argv[2], num_fields=2)
+    else: 
+        try: 
+            searches = [(sys.argv[1], sys.argv[2])]
+        except IndexError: 
+            raise Exception('Program needs a job title and job location ' 
+                    '(or --batch and a CSV of them) inputted!')
+
+    # Every search shares one pool of warm browsers. 
+    run_browser_searches(searches, scrape_search, pool_size=2)
@@ -1,9 +1,9 @@
-"""A module for threading requests and storing their results. 
+"""A module for parsing job results, and the postings they link to. 
 
-This module currently provides one class - `RequestInfoThread`. It is meant to help 
-issue get requests using threading, but avoid creating a new connection to a db for
-each thread. It does this by storing the results of the get request as an attribute
-on the class. 
+This module currently provides a couple of helper functions - `parse_row`, 
+`gen_posting_url`, `gen_posting_key`, and `parse_posting_txt`. They are used to 
+parse a page of rows, and then fetch all of their postings at once (see 
+`job_scraper.multiprocess_pages`). 
 """
 import sys
 import os
@@ -11,88 +11,95 @@ wd = os.path.abspath('.')
 sys.path.append(wd + '/../')
 import datetime
 import pytz
-import re
-from threading import Thread
-from requests import get
-from bs4 import BeautifulSoup
-from general_utilities.parsing_utilities import find_visible_texts
+from general_utilities.query_utilities import normalize_href
+from general_utilities.parsing_utilities import extract_visible_text
+from general_utilities.extraction_utilities import ExtractionSpec
 
+# Holds the label to store the info. as the key, and the CSS selector to grab it 
+# with as the value. Compiled once, and then applied to every row. 
+ROW_SPEC = ExtractionSpec({'job_title': '.jobtitle', 'company': '.company', 
+        'location': '.location', 'date': '.date', 'easy_apply': '.iaLabel', 
+        'href': ('a', 'href')})
 
-class RequestInfoThread(Thread): 
-    """Threading based class to issue get requests and store the results.  
-    
-    RequestInfoThread issues a get request on the href from an inputted row (which
-    represents a job), after grabbing all of its relevant information. It then 
-    stores the results as an attribute available for later access. The motivation 
-    for using a class instead of simply passing a function to ThreadPool was to
-    avoid creating a new connection with the database (here Mongo) for each get
-    request (this would most likely overwhelm the comp. with threads). 
 
+def parse_row(row, job_title, job_location): 
+    """Grab relevant information from the row, other than the posting text.
 
     Args: 
     ----
         row: bs4.BeautifulSoup object.
-            Holds a job, including all of the info. that we want to parse from it. 
         job_title: str
         job_location: str
+
+    Return: 
+    ------
+        json_dct: dct
+    """
+
+    current_date = str(datetime.datetime.now(pytz.timezone('US/Mountain')))
+    json_dct = {'search_title': job_title, \
+            'search_location': job_location, \
+            'search_date': current_date, 'job_site': 'indeed'}
+
+    # Fields that aren't in the row are left out by `extract`, so the href is 
+    # filled in with None if the row has no link to its posting. 
+    fields = ROW_SPEC.extract(row)
+    json_dct.update(fields)
+    json_dct['href'] = fields.get('href')
+    json_dct['posting_key'] = gen_posting_key(json_dct['href'])
+
+    return json_dct
+
+def gen_posting_url(href): 
+    """Turn the href to a job posting into a full URL. 
+
+    Args: 
+    ----
+        href: str or None
+            Holds None if the job had no link to its posting. 
+
+    Return: str (or '', if there was no href)
+    """
+
+    if not href: 
+        return ''
+
+    return 'http://www.indeed.com' + href if href.startswith('/') else href
+
+def gen_posting_key(href): 
+    """Generate the key used to check whether a job posting is already stored. 
+
+    This is the normalized URL of the posting (see `normalize_href`), which drops 
+    tracking parameters that vary from one search to the next.
+
+    Indeed links to a posting with a number of different parameters, but its 
+    'jk' job key identifies the posting on its own.
+
+    Args: 
+    ----
+        href: str or None
+
+    Return: str (or '', if there was no href)
+    """
+
+    if not href: 
+        return ''
+
+    return normalize_href(gen_posting_url(href), keep_params=('jk',))
+
+def parse_posting_txt(content): 
+    """Grab the visible text from the content of a job posting. 
+
+    Args: 
+    ----
+        content: bytes or None
+            Holds the body of the response for the job posting, or None if there
+            was no href to request it from. 
+
+    Return: str
     """
 
-    def __init__(self, row, job_title, job_location): 
-        super(RequestInfoThread, self).__init__()
-        self.row = row
-        self.job_title = job_title
-        self.job_location = job_location
-
-    def run(self): 
-        self.json_dct = self._request_info()
-
-    def _request_info(self): 
-        """Grab relevant information from the row.
-
-        Return: 
-        ------
-            json_dct: dct
-        """
-        
-        current_date = str(datetime.datetime.now(pytz.timezone('US/Mountain')))
-        json_dct = {'search_title': self.job_title, \
-                'search_location': self.job_location, \
-                'search_date': current_date, 'job_site': 'indeed'}
-        # Holds the actual CSS selector as the key and the label to store the info.
-        # as as the key. 
-        possible_attributes = {'.jobtitle': "job_title", '.company': "company", \
-                '.location': "location", '.date': "date", \
-                '.iaLabel': "easy_apply"}
-        for k, v in possible_attributes.items(): 
-            res = self.row.select(k)
-            if res: 
-                json_dct[v] = res[0].text
-        # Grab the href and pass that on to another function to get that info. 
-        href = self.row.find('a').get('href')
-        json_dct['href'] = href
-        json_dct['posting_txt'] = self._query_href(href)
-
-        return json_dct
-
-    def _query_href(self, href): 
-        """Grab the text from the href. 
-
-        Args: 
-        ----
-            href: str 
-
-        Return: str
-        """
-        try:
-            html = get('http://www.indeed.com' + href) if href.startswith('/') \
-                    else get(href)
-            soup = BeautifulSoup(html.content, 'html.parser')
-
-            texts = soup.findAll(text=True)
-            visible_texts = filter(find_visible_texts, texts)
-        except Exception as e: 
-            print(e)
-            visible_texts = ['SSLError', 'happened']
-
-        return ' '.join(visible_texts)
+    if content is None: 
+        return ''
 
+    return extract_visible_text(content)
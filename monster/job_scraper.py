@@ -8,22 +8,37 @@ storage that takes place.
 Usage: 
 
     python job_scraper.py <job title> <job location> <radius>
+    python job_scraper.py --batch <searches CSV>
+
+Postings that can't be fetched (after retrying) are recorded in the 
+`dead_letters` database, and can be re-crawled on their own with: 
+
+    python job_scraper.py --retry-failed
 """
 
 import sys
 import os
 wd = os.path.abspath('.')
 sys.path.append(wd + '/../')
+import math
 import datetime
 import pytz
-from selenium import webdriver
-from selenium.webdriver.common.keys import Keys
-from general_utilities.storage_utilities import store_in_mongo
-from general_utilities.query_utilities import get_html, format_query
-from general_utilities.navigation_utilities import issue_driver_query
-from general_utilities.parsing_utilities import parse_num
+from general_utilities.storage_utilities import (store_in_mongo, 
+        find_stored_keys, record_dead_letter)
+from general_utilities.query_utilities import (format_query, 
+        normalize_href, set_query_param)
+from selenium.webdriver.common.by import By
+from general_utilities.navigation_utilities import (issue_driver_query, 
+        run_browser_pages, wait_for_element, wait_for_network_idle, jitter, 
+        query_page)
+from general_utilities.batch_utilities import (read_searches, 
+        recrawl_dead_letters)
+from general_utilities.parsing_utilities import parse_num, extract_visible_text
 from general_utilities.threading_utilities import HrefQueryThread
 
+# Number of jobs Monster shows on each page of results. 
+JOBS_PER_PAGE = 25
+
 def scrape_job_page(driver, job_title, job_location):
     """Scrape a page of jobs from Monster.
 
@@ -46,50 +61,71 @@ def scrape_job_page(driver, job_title, job_location):
             'search_location': job_location, \
             'search_date': current_date, 'job_site': 'monster'}
 
+    posting_keys = [normalize_href(href) if href else '' for href in hrefs]
+    # Only fetch the postings that haven't been stored already (e.g. by the 
+    # previous day's run of an overlapping search). 
+    stored_keys = find_stored_keys(posting_keys, 'job_postings', 
+            'monster', 'posting_key')
+
     thread_lst = []
-    for href in hrefs: 
-        try: 
-            thread = HrefQueryThread(href.get_attribute('href'))
-        except: 
-            print('Exception in href thread builder')
-            thread = HrefQueryThread('')
+    for href, posting_key in zip(hrefs, posting_keys): 
+        if posting_key and posting_key in stored_keys: 
+            thread_lst.append(None)
+            continue
+        stored_keys.add(posting_key)
+        thread = HrefQueryThread(href)
         thread_lst.append(thread)
         thread.start()
     mongo_update_lst = []
-    for title, location, company, date, thread in \
-            zip(titles, locations, companies, dates, thread_lst): 
+    for title, location, company, date, thread, posting_key in \
+            zip(titles, locations, companies, dates, thread_lst, posting_keys): 
+        if thread is None: 
+            continue
         try: 
             mongo_dct = gen_output(json_dct.copy(), title, location, 
                     company, date, thread)
-            mongo_update_lst.append(mongo_dct)
+            mongo_dct['posting_key'] = posting_key
         except: 
             print('Missed element in Monster!')
+            continue
+
+        if thread.error is not None: 
+            # Keep track of the posting, so it can be re-crawled later on. 
+            del mongo_dct['posting_txt']
+            record_dead_letter(thread.error, 'monster', document=mongo_dct)
+        else: 
+            mongo_update_lst.append(mongo_dct)
 
     store_in_mongo(mongo_update_lst, 'job_postings', 'monster')
 
 def query_for_data(driver): 
     """Grab all relevant data on a jobs page. 
 
+    Everything is grabbed from the browser in one go (see `query_page`). 
+
+    Args: 
+    ----
+        driver: Selenium webdriver
+
     Return: 
     ------
-        job_titles: list
-        job_locations: list 
-        posting_companies: list 
-        dates: list
-        hrefs: list 
+        job_titles: list of strings
+        job_locations: list of strings
+        posting_companies: list of strings
+        dates: list of strings
+        hrefs: list of strings
     """
 
-    job_titles = driver.find_elements_by_xpath(
-            "//span[@itemprop='title']")
-    job_locations = driver.find_elements_by_xpath(
-        "//div[@itemprop='jobLocation']")
-    posting_companies = driver.find_elements_by_xpath(
-        "//span[@itemprop='name']")
-    dates = driver.find_elements_by_xpath(
-        "//time[@itemprop='datePosted']")
-    hrefs = driver.find_elements_by_xpath("//div//article//div//h2//a")
+    selectors = {'job_titles': "span[itemprop='title']", 
+            'job_locations': "div[itemprop='jobLocation']", 
+            'posting_companies': "span[itemprop='name']", 
+            'dates': "time[itemprop='datePosted']", 
+            'hrefs': 'div article div h2 a'}
+    page_data = query_page(driver, selectors, attributes={'hrefs': 'href'})
 
-    return job_titles, job_locations, posting_companies, dates, hrefs
+    return (page_data['job_titles'], page_data['job_locations'], 
+            page_data['posting_companies'], page_data['dates'], 
+            page_data['hrefs'])
 
 def gen_output(json_dct, title, location, company, date, thread): 
     """Format the output dictionary that will end up going into Mongo. 
@@ -97,10 +133,10 @@ def gen_output(json_dct, title, location, company, date, thread):
     Args: 
     ----
         json_dct: dict
-        title: Selenium WebElement 
-        location: Selenium WebElement 
-        company: Selenium WebElement
-        date: Selenium WebElement
+        title: str
+        location: str
+        company: str
+        date: str
         thread: RequestThreadInfo object
 
     Return:
@@ -110,37 +146,14 @@ def gen_output(json_dct, title, location, company, date, thread):
 
     thread.join()
 
-    json_dct['job_title'] = title.text
-    json_dct['location'] = location.text
-    json_dct['company'] = company.text
-    json_dct['date'] = date.text
+    json_dct['job_title'] = title
+    json_dct['location'] = location
+    json_dct['company'] = company
+    json_dct['date'] = date
     json_dct['posting_txt'] = thread.posting_txt
 
     return json_dct
 
-def check_if_next(driver): 
-    """Check if there is a next page of job results to grab. 
-
-    Grab the clickable job links on the bottom of the page, and check if one 
-    of those reads 'Next'. If so, click it, and otherwise return `False`. 
-
-    Args: 
-    ----
-        driver: Selenium webdriver
-
-    Return: bool
-    """
-    
-    page_links = driver.find_elements_by_class_name('page-link')
-    # page_links will now hold a list of all the links. The last link in that 
-    # list will hold 'Next' for the text, if we aren't on the last page of jobs. 
-    last_link = page_links[-1] if page_links else None
-    if last_link and last_link.text == 'Next': 
-        last_link.send_keys(Keys.ENTER)
-        return True
-    else: 
-        return False
-
 def get_num_jobs_txt(driver): 
     """Get the number of jobs text. 
 
@@ -163,13 +176,28 @@ def get_num_jobs_txt(driver):
 
     return num_jobs_txt
         
-if __name__ == '__main__':
-    try: 
-        job_title = sys.argv[1]
-        job_location = sys.argv[2]
-        radius = sys.argv[3]
-    except IndexError: 
-        raise Exception('Program needs a job title, job location, and radius inputted!')
+def gen_page_tasks(driver, job_title, job_location, radius): 
+    """Query the search, and generate a task for each page of its results. 
+
+    Find the number of jobs for the search (storing it in Mongo), and use it to 
+    figure out the URL of each page of results, so that the pages can be loaded 
+    directly (and in parallel), rather than by clicking 'Next' on each one. 
+
+    Args: 
+    ----
+        driver: Selenium webdriver
+            Holds the browser to run the search in (e.g. one from a 
+            `BrowserPool`). 
+        job_title: str
+        job_location: str
+        radius: str
+
+    Return: 
+    ------
+        page_tasks: list of tuples
+            Holds the arguments to pass to `scrape_page` (after the browser) 
+            for each page. 
+    """
 
     base_URL = 'http://jobs.monster.com/search/?'
     query_parameters = ['q={}'.format('-'.join(job_title.split())), 
@@ -177,22 +205,55 @@ if __name__ == '__main__':
             '&rad={}'.format(radius)]
 
     query_URL = format_query(base_URL, query_parameters)
-    driver = issue_driver_query(query_URL)
+    issue_driver_query(query_URL, driver=driver)
     
     try: 
+        wait_for_element(driver, (By.CLASS_NAME, 'page-title'))
         num_jobs_txt = get_num_jobs_txt(driver)
         num_jobs = int(parse_num(num_jobs_txt, 0))
     except: 
         print('No jobs for search {} in {}'.format(job_title, job_location))
-        sys.exit(0)
+        return []
 
     current_date = str(datetime.datetime.now(pytz.timezone('US/Mountain')))
     storage_dct = {'job_site': 'monster', 'num_jobs': num_jobs, 
             'date': current_date, 'title': job_title, 'location': job_location}
     store_in_mongo([storage_dct], 'job_numbers', 'monster')
     
-    is_next = True
-    while is_next: 
-        scrape_job_page(driver, job_title, job_location)
-        is_next = check_if_next(driver)
-    driver.close()
+    num_pages = math.ceil(num_jobs / JOBS_PER_PAGE)
+    return [(set_query_param(query_URL, 'page', page_num), job_title, 
+        job_location) for page_num in range(1, num_pages + 1)]
+
+def scrape_page(driver, page_URL, job_title, job_location): 
+    """Load a page of job results in the browser, and scrape it. 
+
+    Args: 
+    ----
+        driver: Selenium webdriver
+        page_URL: str
+        job_title: str
+        job_location: str
+    """
+
+    driver.get(page_URL)
+    wait_for_network_idle(driver)
+    jitter(5)
+    scrape_job_page(driver, job_title, job_location)
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['--retry-failed']: 
+        # Only postings are recorded as dead letters - pages need a browser. 
+        recrawl_dead_letters('monster', None, extract_visible_text)
+        sys.exit(0)
+
+    if len(sys.argv) == 3 and sys.argv[1] == '--batch': 
+        searches = read_searches(sys.argv[2], num_fields=3)
+    else: 
+        try: 
+            searches = [(sys.argv[1], sys.argv[2], sys.argv[3])]
+        except IndexError: 
+            raise Exception('Program needs a job title, job location, and radius ' 
+                    '(or --batch and a CSV of them) inputted!')
+
+    # Every search (and page of results) shares one pool of warm browsers. 
+    run_browser_pages(searches, gen_page_tasks, scrape_page, pool_size=4)
@@ -4,15 +4,19 @@ import sys
 import os
 wd = os.path.abspath('.')
 sys.path.append(wd + '/../')
+import time
 import pandas as pd
-import numpy as np
-from datetime import timedelta
-from requests import get
-from time import sleep
-from os.path import exists
-from pymongo import MongoClient
-from general_utilities.query_utilities import check_response_code, get_html
-from general_utilities.storage_utilities import store_in_mongo
+from datetime import datetime, timedelta
+from threading import Event, Lock
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from general_utilities.query_utilities import (get_html, get_session, 
+        gen_class_strainer)
+from general_utilities.storage_utilities import store_in_mongo, get_mongo_client
+from general_utilities.rate_limit_utilities import RateLimiter, RateLimitExceeded
+from general_utilities.retry_utilities import (FetchError, classify_error, 
+        gen_backoff, MAX_ATTEMPTS, PERMANENT, RETRY_STATUS_CODES)
+from general_utilities.ledger_utilities import CrawlLedger
+from general_utilities.dedup_utilities import FingerprintIndex
 
 class NYTPageScraper(object): 
     """Scraper for pages of results returned by the Article Search API from NYTimes.
@@ -27,54 +31,95 @@ class NYTPageScraper(object):
     a `page` parameter. The `page` parameter is capped at 100, which caps the
     total number of results at 1000 for a single query. The total number of results
     can be limited by adding aditional search parameters. This can be a way to ensure
-    that all possible results are captured for a given query.
+    that all possible results are captured for a given query. The scraper does this
+    automatically when a query has more results than the cap, by splitting the 
+    query into smaller windows of time (see `scrape_window`). 
 
     Args: 
     ----
         queries_path (optional): str
             Holds a filepath location to keep track of successfully issued queries.
-            Expected to be pointed at a `.csv` file. 
+            Expected to be pointed at a SQLite database (see `CrawlLedger`), 
+            which is created if it doesn't exist. 
+        rate_limiter (optional): RateLimiter
+            Used to space out requests to the API. Pass in a limiter with a 
+            `state_path` to share the API key's limits across processes. Defaults
+            to 5 requests per second. 
+        max_retries (optional): int
+            Holds the number of times to back off and retry a request that is 
+            rate limited (429), before giving up on scraping. 
+        dedup_index (optional): 
+            Used to check whether an article's `web_url` has already been 
+            stored. Can be any object with `open`, `close`, `add`, and 
+            `__contains__` methods. Defaults to a `FingerprintIndex` kept at 
+            `work/web_urls.idx`. 
+        legacy_queries_path (optional): str
+            Holds a filepath location of a `.csv` file that older versions of the
+            scraper kept track of scraped dates in. Dates marked as scraped in it
+            are seeded into the ledger (see `update_ledger`), so they aren't 
+            scraped again. Defaults to `queries_path` with a `.csv` extension. 
     """
 
-    def __init__(self, queries_path='work/queries.csv'): 
+    def __init__(self, queries_path='work/queries.db', rate_limiter=None, 
+                 max_retries=5, dedup_index=None, legacy_queries_path=None): 
         self.articles = [] 
         self.queries_path = queries_path
+        self.legacy_queries_path = legacy_queries_path if legacy_queries_path \
+                is not None else os.path.splitext(queries_path)[0] + '.csv'
+        self.rate_limiter = rate_limiter if rate_limiter is not None else \
+                RateLimiter(per_second=5)
+        self.max_retries = max_retries
+        self.web_urls = dedup_index
+        # Holds the `web_url`s of articles parsed but not yet stored - they're 
+        # only added to `self.web_urls` once they're in Mongo. 
+        self.pending_web_urls = set()
         self.base_url = 'http://api.nytimes.com/svc/search/v2/articlesearch.json'
-        self.scrape = True 
+        self.max_pages = 100
+        self.results_per_page = 10
+        # Guards `self.articles`, `self.pending_web_urls`, and `self.web_urls`, 
+        # which are shared when scraping multiple dates/pages at once. 
+        self.lock = Lock()
+        self.stop_scraping = Event()
 
     def __enter__(self): 
         """Set up to make sure there is no duplicate scraping/storing.""" 
-        if exists(self.queries_path): 
-            # Use to ensure that there is no duplicate scraping in terms of dates. 
-            self.queries_df = pd.read_csv(self.queries_path, index_col=0, 
-                                          parse_dates=True)
-        else: 
-            self.queries_df = pd.DataFrame()
+        # Use to ensure that there is no duplicate scraping in terms of dates. 
+        self.ledger = CrawlLedger(self.queries_path)
+        self.legacy_dts = self.read_legacy_queries()
 
         # Use to ensure that there are no duplicate web_urls grabbed. 
-        client = MongoClient()
-        db = client['nytimes']
-        collection = db['gen_articles']
-
-        res = collection.find({'web_url': {'$exists': 'true'}}, {'web_url': True, 
-                               '_id': False})
-        res_lst = list(res)
-        self.web_urls = set(article['web_url'] for article in res_lst)
-        client.close()
+        if self.web_urls is None: 
+            collection = get_mongo_client()['nytimes']['gen_articles']
+            self.web_urls = FingerprintIndex('work/web_urls.idx', collection, 
+                                             'web_url')
+        self.web_urls.open()
 
         return self
 
     def __exit__(self, *args): 
-        """Save the `queries_df` for later use."""
-        self.queries_df.sort_index(inplace=True)
-        self.queries_df.to_csv(self.queries_path)
+        """Store any leftover articles, and close the ledger and web_urls index.
+
+        Articles parsed before scraping stopped (e.g. because the rate limits 
+        were hit) are stored here, rather than lost. 
+        """
+        try: 
+            self.dump_articles()
+        finally: 
+            self.ledger.close()
+            self.web_urls.close()
 
-    def scrape_dts(self, start_dt, end_dt, extra_params=None): 
+    def scrape_dts(self, start_dt, end_dt, extra_params=None, max_days=1, 
+                   max_pages=1): 
         """Scrape the NYTimes for multiple dates, using the inputted parameters.
 
-        Loop over each date from the `start_dt` to `end_dt`, calling 
-        `self.scrape_dt`. Scraping over a single day at a time helps to avoid 
-        missing possible search results (see the class docstrings for an explanation).
+        Call `self.scrape_dt` for each date from the `start_dt` to `end_dt`. 
+        Scraping over a single day at a time helps to avoid missing possible 
+        search results (see the class docstrings for an explanation). Up to 
+        `max_days` dates are scraped at once, and up to `max_pages` pages (past 
+        the first) across those dates are fetched at once - all requests still go
+        through `self.rate_limiter`, which keeps the total rate within the API's 
+        limits. If the rate limits for the API are used up, stop scraping (any 
+        dates that weren't finished will be scraped on the next run). 
         
         Args: 
         -----
@@ -83,19 +128,46 @@ class NYTPageScraper(object):
             extra_params (optional): dct
                 Potential extra parameters to pass in the URL when querying the 
                 API (see params at developer.nytimes.com/article_search_v2.json)).
+            max_days (optional): int
+            max_pages (optional): int
         """
         
-        dt_range = pd.date_range(start_dt, end_dt)
-
-        for begin_date in dt_range:
-            begin_date = begin_date.strftime('%Y%m%d') 
-            end_date = begin_date 
-            self.scrape_dt(begin_date, end_date, extra_params)
+        dts = [dt.strftime('%Y%m%d') for dt in pd.date_range(start_dt, end_dt)]
+
+        if max_days == 1 and max_pages == 1: 
+            try: 
+                for begin_date in dts:
+                    end_date = begin_date 
+                    self.scrape_dt(begin_date, end_date, extra_params)
+            except RateLimitExceeded as e: 
+                print('Rate limits hit, stopping: {}'.format(e))
+            return
+
+        # Pages are fetched on a separate pool from dates, so that a date waiting
+        # on its pages never holds up the threads those pages need. 
+        self.stop_scraping.clear()
+        with ThreadPoolExecutor(max_workers=max_pages) as page_executor, \
+                ThreadPoolExecutor(max_workers=max_days) as dt_executor: 
+            futures = [dt_executor.submit(self.scrape_dt, begin_date, begin_date, 
+                                          extra_params, page_executor) 
+                       for begin_date in dts]
+            try: 
+                for future in as_completed(futures): 
+                    future.result()
+            except RateLimitExceeded as e: 
+                print('Rate limits hit, stopping: {}'.format(e))
+                self.stop_scraping.set()
+                for future in futures: 
+                    future.cancel()
             
-    def scrape_dt(self, begin_date, end_date, extra_params=None): 
+    def scrape_dt(self, begin_date, end_date, extra_params=None, 
+                  page_executor=None): 
         """Scrape the NYT for a single date, using the inputted parameters.
 
-        Scrape over as many pages are returned, subject to the page cap at 100.
+        Scrape over as many pages are returned. If there are more results than 
+        the page cap at 100 allows for, the date is split into smaller windows of
+        time (see `self.scrape_window`), so that every result is still captured. 
+        The date is only marked as scraped once every window has been scraped. 
 
         Args: 
         -----
@@ -104,55 +176,213 @@ class NYTPageScraper(object):
             extra_params (optional): dct
                 Potential extra parameters to pass in the URL when querying the 
                 API (see params at developer.nytimes.com/article_search_v2.json)).
+            page_executor (optional): concurrent.futures.Executor
+                If passed in, used to fetch every page past the first at once. 
         """
 
-        params = None if not extra_params else extra_params.copy()
-        # Issue the intial query with page equal to 0. 
-        params['page'] = 0
+        if self.stop_scraping.is_set(): 
+            return
+
+        params = {} if not extra_params else extra_params.copy()
+        # Dates are tracked separately for each distinct set of query parameters.
+        query_key = CrawlLedger.gen_query_key(params, exclude=('api-key', 'page'))
         params['begin_date'] = begin_date
         params['end_date'] = end_date
         
-        self.update_queries_df(begin_date, insert=True)
+        scrape = self.update_ledger(query_key, begin_date, insert=True)
 
-        if self.scrape: 
-            initial_response = self.scrape_single_page(params)
+        if scrape: 
+            finished = self.scrape_window(params, page_executor=page_executor)
+            self.dump_articles()
+            if finished: 
+                self.update_ledger(query_key, begin_date, insert=False)
 
-            num_results = initial_response['response']['meta']['hits']
-            if num_results > 10: 
-                max_pages_to_search = min(100, num_results // 10 + 1)
-                for page in range(1, max_pages_to_search): 
-                    sleep(1/5) # Use to avoid hitting the rate limit. 
+    def scrape_window(self, params, window=None, page_executor=None): 
+        """Scrape all results for the inputted params within a window of time. 
 
-                    params['page'] = page
-                    self.scrape_single_page(params)
-        
-            self.dump_articles()
-            self.update_queries_df(begin_date, insert=False)
+        Issue the initial query (page 0) for the window. If the number of hits is
+        within the page cap, scrape the rest of the pages. Otherwise, split the 
+        window into as many equal windows as are needed to fit the hits under the
+        cap, and scrape each of those (recursively splitting again as needed). 
+        The results from the initial query are kept either way. 
+
+        Args: 
+        ----
+            params: dct
+                Holds the query parameters, including `begin_date` and `end_date`.
+            window (optional): tuple of datetimes
+                Holds the first and last second of the window. If not passed in, 
+                the query is issued over the full dates in `params`, without 
+                adding a window to it. 
+            page_executor (optional): concurrent.futures.Executor
+
+        Return: 
+        ------
+            finished: bool
+                Whether or not every query for the window got a response. 
+        """
+
+        window_params = self._gen_window_params(params, window)
+        initial_response = self.scrape_single_page(dict(window_params, page=0))
+        if initial_response is None: 
+            return False
+
+        num_results = initial_response['response']['meta']['hits']
+        max_results = self.max_pages * self.results_per_page
+        if num_results > max_results: 
+            if window is None: 
+                window = (datetime.strptime(params['begin_date'], '%Y%m%d'), 
+                          datetime.strptime(params['end_date'], '%Y%m%d') + 
+                          timedelta(days=1, seconds=-1))
+            sub_windows = self._split_window(window, num_results // max_results + 1)
+            if sub_windows: 
+                return all([self.scrape_window(params, sub_window, page_executor) 
+                            for sub_window in sub_windows])
+            print('Unable to split {} further, only the first {} of {} results '
+                  'will be scraped.'.format(window, max_results, num_results))
+
+        if num_results > self.results_per_page: 
+            max_pages_to_search = min(self.max_pages, 
+                                      num_results // self.results_per_page + 1)
+            pages_params = [dict(window_params, page=page) for page in 
+                            range(1, max_pages_to_search)]
+            if page_executor is not None: 
+                futures = [page_executor.submit(self.scrape_single_page, 
+                                                page_params) 
+                           for page_params in pages_params]
+                responses = [future.result() for future in futures]
+            else: 
+                responses = [self.scrape_single_page(page_params) for 
+                             page_params in pages_params]
+            if any(response is None for response in responses): 
+                return False
+
+        return True
+
+    def _gen_window_params(self, params, window): 
+        """Restrict the inputted params to the inputted window of time. 
+
+        The window is added as a range on `pub_date` to the `fq` (filter query) 
+        parameter, alongside any filters that are already there. 
+
+        Args: 
+        ----
+            params: dct
+            window: tuple of datetimes or None
+
+        Return: 
+        ------
+            window_params: dct
+        """
+
+        window_params = params.copy()
+        if window is not None: 
+            window_fq = 'pub_date:[{} TO {}]'.format(
+                    *[dt.strftime('%Y-%m-%dT%H:%M:%SZ') for dt in window])
+            if params.get('fq'): 
+                window_fq = '({}) AND {}'.format(params['fq'], window_fq)
+            window_params['fq'] = window_fq
+
+        return window_params
+
+    def _split_window(self, window, num_windows): 
+        """Split the inputted window into `num_windows` equal windows. 
+
+        Args: 
+        ----
+            window: tuple of datetimes
+            num_windows: int
+
+        Return: 
+        ------
+            sub_windows: list of tuples of datetimes
+                Empty if the window is already too small to split. 
+        """
+
+        window_start, window_end = window
+        window_seconds = int((window_end - window_start).total_seconds()) + 1
+        num_windows = min(num_windows, window_seconds)
+        if num_windows < 2: 
+            return []
+
+        sub_windows = []
+        for idx in range(num_windows): 
+            sub_start = window_start + timedelta(
+                    seconds=idx * window_seconds // num_windows)
+            sub_end = window_start + timedelta(
+                    seconds=(idx + 1) * window_seconds // num_windows - 1)
+            sub_windows.append((sub_start, sub_end))
+
+        return sub_windows
 
     def scrape_single_page(self, params):
         """Scrape the NYT for a single page, using the inputted params. 
 
+        Each request waits on `self.rate_limiter`. If the API still responds with 
+        a 429, pause the rate limiter (for as long as the `Retry-After` header 
+        asks, or an exponentially increasing amount of time otherwise) and retry, 
+        up to `self.max_retries` times. 
+
+        Other transient failures (e.g. a timeout, a dropped connection, or a 503)
+        are retried the same way as in `query_utilities.get_content`, up to 
+        `retry_utilities.MAX_ATTEMPTS` attempts in all. If the request still 
+        fails, the error is printed and None is returned (so the date is left to 
+        be scraped on the next run). 
+
         Args: 
         ----
             params: dct
 
         Return: 
         ------
-            response_json: dct
+            response_json: dct or None
+
+        Raises: 
+        ------
+            RateLimitExceeded: if the request is still rate limited after all 
+            retries, or the rate limiter's daily budget is used up. 
         """
 
         if 'page' not in params: 
             print('No `page` paramter pased in, using 0...')
             params['page'] = 0
             
-        response = get(self.base_url, params=params)
-        status_code = response.status_code
-
-        if status_code != 200 and status_code != 429: 
+        num_rate_limited, attempt = 0, 0
+        while True: 
+            self.rate_limiter.acquire()
+            error, status_code = None, None
+            try: 
+                response = get_session().get(self.base_url, params=params)
+                status_code = response.status_code
+            except Exception as e: 
+                error = e
+
+            if status_code == 429: 
+                if num_rate_limited == self.max_retries: 
+                    raise RateLimitExceeded('Still rate limited after {} ' 
+                            'retries.'.format(self.max_retries))
+                retry_after = response.headers.get('Retry-After', '')
+                backoff = int(retry_after) if retry_after.isdigit() else \
+                        min(60, 2 ** num_rate_limited)
+                print('Rate limited, backing off for {} seconds.'.format(backoff))
+                self.rate_limiter.pause(backoff)
+                num_rate_limited += 1
+                continue
+
+            if error is None and status_code not in RETRY_STATUS_CODES: 
+                break
+
+            attempt += 1
+            kind = classify_error(error, status_code)
+            if kind == PERMANENT or attempt == MAX_ATTEMPTS: 
+                reason = repr(error) if error is not None else \
+                        'status code {}'.format(status_code)
+                print(FetchError(self.base_url, kind, reason, status_code, attempt))
+                return None
+            time.sleep(gen_backoff(attempt))
+
+        if status_code != 200: 
             print('Bad URL: {}'.format(response.url))
-        elif status_code == 429: 
-            print('Rate limits hit for the day.')
-            sys.exit(0)
         else: 
             response_json = response.json()
             self.parse_page_results(response_json)
@@ -186,100 +416,211 @@ class NYTPageScraper(object):
                 headline = headline_dct['main']
                 article_dct['headline'] = headline
 
-            if article_dct['web_url'] not in self.web_urls: 
-                self.articles.append(article_dct)
+            # Articles without a `web_url` can't be deduplicated (or have their 
+            # text scraped later on), so they're skipped. 
+            web_url = article_dct['web_url']
+            if web_url is None: 
+                continue
+
+            # Also deduplicates across pages and dates scraped in this run. 
+            with self.lock: 
+                if web_url not in self.web_urls and \
+                        web_url not in self.pending_web_urls: 
+                    self.pending_web_urls.add(web_url)
+                    self.articles.append(article_dct)
 
     def dump_articles(self): 
-        """Dump articles list into Mongo."""
+        """Dump articles list into Mongo.
+
+        Only once the articles are stored are their `web_url`s added to 
+        `self.web_urls`, so that articles that never made it into Mongo (e.g. 
+        because scraping crashed first) are picked up again on the next run. 
+        """
+
+        # Start each day of scraping with an empty list. When scraping multiple
+        # dates at once, this may also dump articles from other dates - they are 
+        # stored either way, and those dates aren't marked as scraped until they
+        # are finished. 
+        with self.lock: 
+            articles, self.articles = self.articles, []
+
+        if articles: 
+            store_in_mongo(articles, 'nytimes', 'gen_articles')
+
+        with self.lock: 
+            for article in articles: 
+                self.web_urls.add(article['web_url'])
+                self.pending_web_urls.discard(article['web_url'])
+
+    def read_legacy_queries(self): 
+        """Read the dates marked as scraped in `self.legacy_queries_path`. 
+
+        The `.csv` file is indexed by date, and has one column (`scraped`) that 
+        holds a 1 if the date has already been scraped for and a 0 otherwise. 
 
-        if self.articles: 
-            client = MongoClient()
-            db = client['nytimes']
-            collection = db['gen_articles']
-            collection.insert_many(self.articles)
-            client.close()
+        Return: 
+        ------
+            legacy_dts: set of strs
+                Holds each scraped date, formatted as `%Y%m%d`. 
+        """
 
-            self.articles = [] # Start each day of scraping with an empty list. 
+        if not os.path.exists(self.legacy_queries_path): 
+            return set()
 
-    def update_queries_df(self, update_dt, insert=True): 
-        """Modify `self.queries_df` for the inputted dates. 
+        queries_df = pd.read_csv(self.legacy_queries_path, index_col=0, 
+                                 parse_dates=True)
+        if 'scraped' not in queries_df.columns: 
+            return set()
 
-        `self.queries_df` will be used to keep track of dates that have already been
-        scraped. It is indexed by date, and has one column (`scraped`) that holds a 1
-        if the date has already been scraped for and a 0 otherwise. 
+        scraped_dts = queries_df.index[queries_df['scraped'] == 1]
+        return set(dt.strftime('%Y%m%d') for dt in scraped_dts)
 
-        If `insert` is True, check if the inputted date is already in 
-        `self.queries_df`. If it isn't, insert a new observation with a 0 value to
-        denote that the date has not been scraped yet. If `insert` is False, update
-        the value of the inputted date in `self.queries_df` with a 1. 
+    def update_ledger(self, query_key, update_dt, insert=True): 
+        """Modify `self.ledger` for the inputted date. 
+
+        `self.ledger` will be used to keep track of dates that have already been
+        scraped for a given set of query parameters. 
+
+        If `insert` is True, check if the inputted date has already been scraped.
+        If it hasn't, record it as started (but not yet scraped) - unless it was 
+        marked as scraped in `self.legacy_queries_path`, in which case record it 
+        as scraped. If `insert` is False, record the inputted date as scraped. 
 
         Args:
         ----
+            query_key: str
             update_dt: str
             insert (optional): bool
 
+        Return: 
+        ------
+            scrape: bool
+                Whether or not the inputted date still needs to be scraped. 
         """
 
-        update_value = 0 if insert else 1
-        update_dt = pd.to_datetime(update_dt)
-        
-        if update_dt in self.queries_df.index: 
-            self.scrape = not self.queries_df.loc[update_dt, 'scraped']
-        else: 
-            self.scrape = 1
+        if not insert: 
+            self.ledger.mark_done(query_key, update_dt)
+            return False
 
-        if self.scrape:
-            self.queries_df.loc[update_dt, 'scraped'] = update_value
+        scrape = not self.ledger.is_done(query_key, update_dt)
+        if scrape and update_dt in self.legacy_dts: 
+            # Seed the ledger with dates scraped by older versions of the 
+            # scraper. Those weren't tracked for each set of query parameters, 
+            # so they're taken to have been scraped for any set. 
+            self.ledger.mark_done(query_key, update_dt)
+            scrape = False
+        if scrape: 
+            self.ledger.mark_pending(query_key, update_dt)
+
+        return scrape
 
 class NYTArticleScraper(object): 
     """Scraper for URLs pointing at New York Times articles.
 
+    Articles that don't have any text yet are streamed from a Mongo cursor, rather
+    than loaded into memory all at once. They are scraped in batches of 
+    `batch_size` - the articles in a batch are fetched concurrently (subject to 
+    `requests_per_sec`), and the batch's text is stored in Mongo as soon as it 
+    finishes. If a run is stopped partway through, at most one batch is lost, and
+    the next run picks up with the articles that still don't have text. 
+
     Args: 
     ----
         db_name: str
         coll_name: str
+        batch_size (optional): int
+            Holds the number of articles to scrape before storing their text. 
+        max_workers (optional): int
+            Holds the number of articles to fetch at once. 
+        requests_per_sec (optional): float
+            Holds the maximum rate at which to issue requests. 
     """
 
-    def __init__(self, db_name, coll_name): 
+    def __init__(self, db_name, coll_name, batch_size=100, max_workers=10, 
+                 requests_per_sec=20): 
         self.db_name = db_name
         self.coll_name = coll_name
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(per_second=requests_per_sec)
+        # Only the story body is needed from each article (see `_parse_soup`). 
+        self.strainer = gen_class_strainer('story-body', 'div')
 
     def __enter__(self): 
-        """Set up URL list for scraping."""
+        """Set up the pool of threads used to fetch articles."""
 
-        client = MongoClient()
-        db = client[self.db_name]
-        collection = db[self.coll_name]
-
-        res = collection.find({'web_url': {'$exists': True}, 
-                                    'text' : {'$exists': False}}, 
-                               {'web_url': True, '_id': False})
-
-        self.articles_to_scrape = list(res)
-        client.close()
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
 
         return self
 
     def __exit__(self, *args): 
-        """Ensure that any URLs scraped for get their text attributes updated."""
+        """Wait on any outstanding requests and shut down the pool of threads."""
         
-        store_in_mongo(self.articles_to_scrape, self.db_name, self.coll_name, 
-                       key='web_url')
+        self.executor.shutdown(wait=True)
 
     def scrape_pages(self):
-        """Scrape all pages stored in `self.web_urls`."""
+        """Scrape all articles in the collection that don't have text yet."""
 
-        for article in self.articles_to_scrape:
-            url = article['web_url']
-            
-            if url.startswith('/'):
-                url = 'http://www.nytimes.com' + url
-            sleep(1/20)
-            soup = get_html(url)
-            article_txt = self._parse_soup(soup)
+        client = get_mongo_client()
+        collection = client[self.db_name][self.coll_name]
+        cursor = collection.find({'web_url': {'$type': 'string'}, 
+                                  'text' : {'$exists': False}}, 
+                                 {'web_url': True, '_id': False}, 
+                                 no_cursor_timeout=True)
+        cursor.batch_size(self.batch_size)
+
+        try: 
+            articles = []
+            for article in cursor: 
+                articles.append(article)
+                if len(articles) == self.batch_size: 
+                    self._scrape_batch(articles)
+                    articles = []
+            self._scrape_batch(articles)
+        finally: 
+            cursor.close()
+
+    def _scrape_batch(self, articles): 
+        """Scrape the inputted articles concurrently, and store their text. 
+
+        Args: 
+        ----
+            articles: list of dictionaries
+        """
+
+        article_txts = self.executor.map(self._scrape_article, articles)
+        scraped_articles = [{'web_url': article['web_url'], 'text': article_txt} 
+                            for article, article_txt in zip(articles, article_txts)
+                            if article_txt]
+        store_in_mongo(scraped_articles, self.db_name, self.coll_name, 
+                       key='web_url')
+
+    def _scrape_article(self, article): 
+        """Scrape the text of the inputted article. 
+
+        Args: 
+        ----
+            article: dct
 
-            if article_txt: 
-                article['text'] = article_txt
+        Returns: 
+        -------
+            article_txt: str or None
+        """
+
+        url = article['web_url']
+        if url.startswith('/'):
+            url = 'http://www.nytimes.com' + url
+
+        # Any error is printed and skipped over, rather than stopping the rest
+        # of the articles from being scraped (the article is picked up again on
+        # the next run, since it still won't have any text). 
+        self.rate_limiter.acquire()
+        try: 
+            soup = get_html(url, parser='lxml', parse_only=self.strainer)
+            return self._parse_soup(soup)
+        except Exception as e: 
+            print('Error scraping article {}: {!r}'.format(url, e))
+            return None
 
     def _parse_soup(self, soup):
         """Parse the inputted `soup`.
@@ -320,8 +661,13 @@ if __name__ == '__main__':
     api_key = os.environ['NYTIMES_API_KEY']
     extra_params['api-key'] = api_key
     if start_dt and end_dt: 
-        with NYTPageScraper(queries_path='work/general.csv') as page_scraper: 
-            page_scraper.scrape_dts(start_dt, end_dt, extra_params)
+        # Share the API key's limits with any other scrapers using it. 
+        rate_limiter = RateLimiter(per_second=5, per_day=1000, 
+                                   state_path='work/api_rate_limits.json')
+        with NYTPageScraper(queries_path='work/general.db', 
+                            rate_limiter=rate_limiter) as page_scraper: 
+            page_scraper.scrape_dts(start_dt, end_dt, extra_params, max_days=4, 
+                                    max_pages=8)
 
     with NYTArticleScraper('nytimes', 'gen_articles') as article_scraper: 
         article_scraper.scrape_pages()
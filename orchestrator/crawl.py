@@ -0,0 +1,157 @@
+"""A module for running a matrix of job searches across every job site at once.
+
+This module is the driver for a multi-site crawl. It takes a CSV of searches,
+and runs each site's scraper (see `sites.SITES`) over all of them. Sites are run
+concurrently, each with its own limit on how many copies of its scraper can run
+at once, so that the slow Selenium based sites don't hold up the fast HTTP based
+ones (and vice versa). The output of each run of a scraper is written to its own
+log file.
+
+Usage:
+
+    python crawl.py <searches CSV> [<site> ...]
+
+where each row of the CSV holds a job title, job location, and radius (the
+radius is ignored for sites that don't take one). By default, every site in
+`sites.SITES` is crawled.
+"""
+
+import sys
+import os
+wd = os.path.abspath('.')
+sys.path.append(wd + '/../')
+import csv
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from general_utilities.batch_utilities import read_searches
+from sites import SITES, gen_site_dir
+
+def gen_site_runs(site, searches, work_dir):
+    """Generate the command line arguments for each run of the site's scraper.
+
+    Sites that support it have their searches split into up to
+    `site.max_concurrency` batches (each written out to a CSV in `work_dir`),
+    with one run per batch, and the rest get one run per search.
+
+    Args:
+    ----
+        site: sites.Site
+        searches: list of tuples
+            Holds the job title, job location, and radius of each search.
+        work_dir: str
+
+    Return:
+    ------
+        site_runs: list of lists
+    """
+
+    num_fields = 3 if site.takes_radius else 2
+    site_searches = [list(search[:num_fields]) for search in searches]
+
+    if site.supports_batch:
+        # Searches are dealt out round robin, so that each batch gets a similar
+        # mix of them.
+        num_batches = min(site.max_concurrency, len(site_searches))
+        site_runs = []
+        for batch_num in range(num_batches):
+            batch_path = os.path.join(work_dir, '{}_searches_{}.csv'.format(
+                site.name, batch_num))
+            with open(batch_path, 'w', newline='') as batch_file:
+                csv.writer(batch_file).writerows(
+                        site_searches[batch_num::num_batches])
+            site_runs.append(['--batch', batch_path])
+        return site_runs
+
+    return site_searches
+
+def run_scraper(site, args, log_path):
+    """Run the site's scraper with the inputted arguments, logging its output.
+
+    Args:
+    ----
+        site: sites.Site
+        args: list of strings
+        log_path: str
+
+    Return:
+    ------
+        return_code: int
+        elapsed: float
+    """
+
+    start_time = time.time()
+    with open(log_path, 'w') as log_file:
+        completed = subprocess.run([sys.executable, 'job_scraper.py'] + args,
+                cwd=gen_site_dir(site), stdout=log_file,
+                stderr=subprocess.STDOUT)
+
+    return completed.returncode, time.time() - start_time
+
+def crawl(searches, site_names, work_dir='work'):
+    """Run every site's scraper over the searches, with per-site concurrency.
+
+    Each site gets its own thread pool, sized to its `max_concurrency`, to run
+    copies of its scraper in. All of the site's runs are queued up front, so
+    every site starts right away and works through its own queue.
+
+    Args:
+    ----
+        searches: list of tuples
+        site_names: list of strings
+        work_dir (optional): str
+            Holds the folder to write batch CSVs and logs to.
+
+    Return:
+    ------
+        failed_runs: list of tuples
+            Holds the site name and arguments of each run that didn't exit
+            cleanly.
+    """
+
+    work_dir = os.path.abspath(work_dir)
+    log_dir = os.path.join(work_dir, 'logs')
+    os.makedirs(log_dir, exist_ok=True)
+
+    executors = {}
+    futures = {}
+    for site_name in site_names:
+        site = SITES[site_name]
+        executors[site_name] = ThreadPoolExecutor(site.max_concurrency)
+        for run_num, args in enumerate(gen_site_runs(site, searches, work_dir)):
+            log_path = os.path.join(log_dir, '{}_{}.log'.format(site_name,
+                run_num))
+            future = executors[site_name].submit(run_scraper, site, args,
+                    log_path)
+            futures[future] = (site_name, args, log_path)
+
+    failed_runs = []
+    for future in as_completed(futures):
+        site_name, args, log_path = futures[future]
+        return_code, elapsed = future.result()
+        print('{} {} finished in {:.0f}s with exit code {} (see {})'.format(
+            site_name, args, elapsed, return_code, log_path))
+        if return_code != 0:
+            failed_runs.append((site_name, args))
+
+    for executor in executors.values():
+        executor.shutdown()
+
+    return failed_runs
+
+if __name__ == '__main__':
+    try:
+        searches_path = sys.argv[1]
+    except IndexError:
+        raise Exception('Program needs a CSV of searches inputted!')
+
+    site_names = sys.argv[2:] or list(SITES)
+    unknown_sites = set(site_names) - set(SITES)
+    if unknown_sites:
+        raise Exception('Unknown sites: {}'.format(sorted(unknown_sites)))
+
+    searches = read_searches(searches_path, num_fields=3)
+    failed_runs = crawl(searches, site_names)
+    if failed_runs:
+        print('{} runs failed: {}'.format(len(failed_runs), failed_runs))
+        sys.exit(1)
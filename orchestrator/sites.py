@@ -0,0 +1,62 @@
+"""A module holding the registry of job sites that `crawl.py` can run.
+
+Each site's scraper lives in its own folder as a standalone `job_scraper.py`,
+and is run from within that folder (each one adds the folder above it to its
+`sys.path`, and the HTTP based ones import a `request_threading` module sitting
+next to them - a name that several of the sites share). The registry therefore
+holds what `crawl.py` needs to know to run each site's scraper as a separate
+program - `SITES` - rather than importing them all into a single process.
+"""
+
+import os
+from collections import namedtuple
+
+# Folder holding all of the site folders (i.e. the root of the repo).
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+Site = namedtuple('Site', ['name', 'takes_radius', 'supports_batch',
+    'max_concurrency'])
+Site.__doc__ = """A job site, and how to run its scraper.
+
+Args:
+----
+    name: str
+        Holds the name of the site's folder.
+    takes_radius: bool
+        Whether the scraper takes a radius after the job title and location.
+    supports_batch: bool
+        Whether the scraper accepts `--batch <searches CSV>`, running every
+        search through a single pool of workers (or browsers).
+    max_concurrency: int
+        Holds the maximum number of copies of the scraper to run at once. For
+        sites that support batches, the searches are split into up to this
+        many batches, each run by its own copy of the scraper.
+"""
+
+# HTTP based sites run a single batch over every search, since a batch already
+# spreads out over all available cores. Selenium based sites split the searches
+# into a couple of batches, each spread out over its own pool of warm browsers
+# (see `navigation_utilities.BrowserPool`).
+SITES = {site.name: site for site in [
+    Site('indeed', takes_radius=True, supports_batch=True, max_concurrency=1),
+    Site('ziprecruiter', takes_radius=True, supports_batch=True,
+        max_concurrency=1),
+    Site('simplyhired', takes_radius=True, supports_batch=True,
+        max_concurrency=1),
+    Site('monster', takes_radius=True, supports_batch=True, max_concurrency=2),
+    Site('careerbuilder', takes_radius=False, supports_batch=True,
+        max_concurrency=2),
+    Site('glassdoor', takes_radius=False, supports_batch=True,
+        max_concurrency=2)]}
+
+def gen_site_dir(site):
+    """Return the folder holding the inputted site's scraper.
+
+    Args:
+    ----
+        site: Site
+
+    Return: str
+    """
+
+    return os.path.join(REPO_DIR, site.name)
@@ -2,25 +2,40 @@
 
 This module is the driver for a SimplyHired scraper. It controls the process of
 issuing requests, parsing the contents of those requests, and storing the results. 
-It also handles the threading and multiprocessing that is used to speed up the scraping process. 
+It also handles the asynchronous requests and multiprocessing that are used to 
+speed up the scraping process. 
 
 Usage: 
 
     python job_scraper.py <job title> <job location> <radius>
+
+or, to run a batch of searches through a single pool of workers: 
+
+    python job_scraper.py --batch <searches CSV>
+
+where each row of the CSV holds a job title, job location, and radius. Searches, 
+pages, and postings that can't be fetched (after retrying) are recorded in the 
+`dead_letters` database, and can be re-crawled on their own with: 
+
+    python job_scraper.py --retry-failed
 """
 
 import sys
 import os
 wd = os.path.abspath('.')
 sys.path.append(wd + '/../')
-import multiprocessing
 import datetime
 import pytz
-from functools import partial
-from general_utilities.query_utilities import format_query, get_html
-from general_utilities.storage_utilities import store_in_mongo
+from general_utilities.query_utilities import (format_query, get_html, 
+        gen_class_strainer, get_response_cache)
+from general_utilities.storage_utilities import (store_in_mongo, 
+        get_buffered_writer, filter_unstored, record_dead_letter)
 from general_utilities.parsing_utilities import parse_num
-from request_threading import RequestInfoThread
+from general_utilities.async_utilities import fetch_all
+from general_utilities.batch_utilities import (read_searches, run_searches, 
+        recrawl_dead_letters)
+from general_utilities.retry_utilities import FetchError
+from request_threading import parse_job_result, gen_posting_url, parse_posting_txt
 
 def multiprocess_pages(base_URL, job_title, job_location, page_number): 
     """Grab the URLS and other relevant info. from job postings on the page. 
@@ -39,43 +54,73 @@ def multiprocess_pages(base_URL, job_title, job_location, page_number):
     """
 
     url = base_URL + '&pn=' + str(page_number)
-    html = get_html(url)
+    # Only build the tree for the job results, since that's all we need here. 
+    try: 
+        html = get_html(url, parser='lxml', 
+                parse_only=gen_class_strainer('js-job'))
+    except FetchError as e: 
+        # Keep track of the page, so it can be re-scraped later on. 
+        record_dead_letter(e, 'simplyhired', page_task=(base_URL, job_title, 
+            job_location, page_number))
+        return
     # Each row corresponds to a job. 
     jobs = html.select('.js-job')
-    threads = []
-    mongo_update_lst = []
-    for job in jobs: 
-        thread = RequestInfoThread(job, job_title, job_location)
-        thread.start()
-        threads.append(thread)
-    for thread in threads: 
-        thread.join()
-        mongo_update_lst.append(thread.json_dct)
+    mongo_update_lst = [parse_job_result(job, job_title, job_location) for 
+            job in jobs]
+    # Only fetch the postings that haven't been stored already (e.g. by the 
+    # previous day's run of an overlapping search). 
+    mongo_update_lst = filter_unstored(mongo_update_lst, 'job_postings', 
+            'simplyhired', 'posting_key')
+    posting_urls = [gen_posting_url(json_dct['href']) for json_dct in 
+            mongo_update_lst]
+    # Fetch all of the postings on the page at once, from a single event loop. 
+    # Postings seen on an earlier run are served from (or revalidated against) 
+    # the on-disk response cache, rather than downloaded again. 
+    contents = fetch_all(posting_urls, cache=get_response_cache())
+    fetched_lst = []
+    for json_dct, content in zip(mongo_update_lst, contents): 
+        if isinstance(content, FetchError): 
+            # Keep track of the posting, so it can be re-crawled later on. 
+            record_dead_letter(content, 'simplyhired', document=json_dct)
+            continue
+        json_dct['posting_txt'] = parse_posting_txt(content)
+        fetched_lst.append(json_dct)
     
-    store_in_mongo(mongo_update_lst, 'job_postings', 'simplyhired')
+    # Postings are buffered across pages and inserted in large batches. 
+    get_buffered_writer('job_postings', 'simplyhired').write(fetched_lst)
 
-if __name__ == '__main__':
-    try: 
-        job_title = sys.argv[1]
-        job_location = sys.argv[2]
-        radius = sys.argv[3]
-    except IndexError: 
-        raise Exception('Program needs a job title, job location, and radius inputted!')
+def gen_page_tasks(search): 
+    """Query the search, and generate a task for each page of its results. 
+
+    Find the number of jobs for the search (storing it in Mongo), and use it to 
+    figure out which pages of results there are to scrape. 
+
+    Args: 
+    ----
+        search: tuple
+            Holds the job title, job location, and radius to search for. 
 
+    Return: 
+    ------
+        page_tasks: list of tuples
+            Holds the arguments to pass to `multiprocess_pages` for each page. 
+    """
+
+    job_title, job_location, radius = search
     base_URL = 'http://www.simplyhired.com/search?'
     query_parameters = ['q={}'.format('+'.join(job_title.split())), 
             '&l={}'.format('+'.join(job_location.split())), '&mi={}'.format(radius),
             '&fdb=5', '&clst=CTL']
-    
-    query_URL = format_query(base_URL, query_parameters)
 
+    query_URL = format_query(base_URL, query_parameters)
     html = get_html(query_URL)
+
     try: 
         num_jobs_txt = str(html.select('.result-headline')[0].text)
         num_jobs = int(parse_num(num_jobs_txt, 2))
     except: 
         print('No jobs for search {} in {}'.format(job_title, job_location))
-        sys.exit(0)
+        return []
 
     current_date = str(datetime.datetime.now(pytz.timezone('US/Mountain')))
     storage_dct = {'job_site': 'simplyhired', 'num_jobs': num_jobs, 
@@ -85,7 +130,23 @@ if __name__ == '__main__':
     # All of the jobs should be available through the '.js-job-link' CSS class.
     max_pages = num_jobs // 10 + 1
     page_numbers = range(1, max_pages + 1)
-    execute_queries = partial(multiprocess_pages, query_URL, job_title, 
-            job_location)
-    pool = multiprocessing.Pool(multiprocessing.cpu_count())
-    pool.map(execute_queries, page_numbers)
+    return [(query_URL, job_title, job_location, page_number) for page_number in 
+            page_numbers]
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['--retry-failed']: 
+        recrawl_dead_letters('simplyhired', multiprocess_pages, 
+                parse_posting_txt, gen_page_tasks=gen_page_tasks)
+        sys.exit(0)
+
+    if len(sys.argv) == 3 and sys.argv[1] == '--batch': 
+        searches = read_searches(sys.argv[2], num_fields=3)
+    else: 
+        try: 
+            searches = [(sys.argv[1], sys.argv[2], sys.argv[3])]
+        except IndexError: 
+            raise Exception('Program needs a job title, job location, and radius ' 
+                    '(or --batch and a CSV of them) inputted!')
+
+    # Every search (and page of results) shares one pool of workers. 
+    run_searches(searches, gen_page_tasks, multiprocess_pages, site='simplyhired')
@@ -2,26 +2,40 @@
 
 This module is the driver for a ZipRecruiter scraper. It controls the process of
 issuing requests, parsing the contents of those requests, and storing the results. 
-It also handles the threading and multiprocessing that is used to speed up the
-scraping process. 
+It also handles the asynchronous requests and multiprocessing that are used to 
+speed up the scraping process. 
 
 Usage: 
 
     python job_scraper.py <job title> <job location> <radius>
+
+or, to run a batch of searches through a single pool of workers: 
+
+    python job_scraper.py --batch <searches CSV>
+
+where each row of the CSV holds a job title, job location, and radius. Searches, 
+pages, and postings that can't be fetched (after retrying) are recorded in the 
+`dead_letters` database, and can be re-crawled on their own with: 
+
+    python job_scraper.py --retry-failed
 """
 
 import sys
 import os
 wd = os.path.abspath('.')
 sys.path.append(wd + '/../')
-import multiprocessing
 import datetime
 import pytz
-from functools import partial
-from general_utilities.query_utilities import get_html, format_query
-from general_utilities.storage_utilities import store_in_mongo
+from general_utilities.query_utilities import (get_html, format_query, 
+        gen_class_strainer, get_response_cache)
+from general_utilities.storage_utilities import (store_in_mongo, 
+        get_buffered_writer, filter_unstored, record_dead_letter)
 from general_utilities.parsing_utilities import parse_num
-from request_threading import RequestInfoThread
+from general_utilities.async_utilities import fetch_all
+from general_utilities.batch_utilities import (read_searches, run_searches, 
+        recrawl_dead_letters)
+from general_utilities.retry_utilities import FetchError
+from request_threading import parse_job_result, gen_posting_url, parse_posting_txt
 
 def multiprocess_pages(base_URL, job_title, job_location, page_num): 
     """Grab the URLs and other relevant info. from job postings on the page. 
@@ -39,29 +53,59 @@ def multiprocess_pages(base_URL, job_title, job_location, page_num):
         page_start: int 
     """
 
-    url = query_URL + '&page=' + str(page_num)
-    html = get_html(url)
+    url = base_URL + '&page=' + str(page_num)
+    # Only build the tree for the job results, since that's all we need here. 
+    try: 
+        html = get_html(url, parser='lxml', 
+                parse_only=gen_class_strainer('job_result'))
+    except FetchError as e: 
+        # Keep track of the page, so it can be re-scraped later on. 
+        record_dead_letter(e, 'ziprecruiter', page_task=(base_URL, job_title, 
+            job_location, page_num))
+        return
     rows = html.select('.job_result')
-    threads = []
-    mongo_update_lst = []
-    for row in rows: 
-        thread = RequestInfoThread(row, job_title, job_location)
-        thread.start()
-        threads.append(thread)
-    for thread in threads: 
-        thread.join()
-        mongo_update_lst.append(thread.json_dct)
-
-    store_in_mongo(mongo_update_lst, 'job_postings', 'ziprecruiter')
+    mongo_update_lst = [parse_job_result(row, job_title, job_location) for 
+            row in rows]
+    # Only fetch the postings that haven't been stored already (e.g. by the 
+    # previous day's run of an overlapping search). 
+    mongo_update_lst = filter_unstored(mongo_update_lst, 'job_postings', 
+            'ziprecruiter', 'posting_key')
+    posting_urls = [gen_posting_url(json_dct['href']) for json_dct in 
+            mongo_update_lst]
+    # Fetch all of the postings on the page at once, from a single event loop. 
+    # Postings seen on an earlier run are served from (or revalidated against) 
+    # the on-disk response cache, rather than downloaded again. 
+    contents = fetch_all(posting_urls, cache=get_response_cache())
+    fetched_lst = []
+    for json_dct, content in zip(mongo_update_lst, contents): 
+        if isinstance(content, FetchError): 
+            # Keep track of the posting, so it can be re-crawled later on. 
+            record_dead_letter(content, 'ziprecruiter', document=json_dct)
+            continue
+        json_dct['posting_txt'] = parse_posting_txt(content)
+        fetched_lst.append(json_dct)
+
+    # Postings are buffered across pages and inserted in large batches. 
+    get_buffered_writer('job_postings', 'ziprecruiter').write(fetched_lst)
     
-if __name__ == '__main__': 
-    try: 
-        job_title = sys.argv[1]
-        job_location = sys.argv[2]
-        radius = sys.argv[3]
-    except IndexError: 
-        raise Exception('Program needs a job title, job location, and radius inputted!')
+def gen_page_tasks(search): 
+    """Query the search, and generate a task for each page of its results. 
+
+    Find the number of jobs for the search (storing it in Mongo), and use it to 
+    figure out which pages of results there are to scrape. 
+
+    Args: 
+    ----
+        search: tuple
+            Holds the job title, job location, and radius to search for. 
+
+    Return: 
+    ------
+        page_tasks: list of tuples
+            Holds the arguments to pass to `multiprocess_pages` for each page. 
+    """
 
+    job_title, job_location, radius = search
     base_URL = 'https://www.ziprecruiter.com/candidate/search?'
     query_parameters = ['search={}'.format('+'.join(job_title.split())),
             '&location={}'.format('+'.join(job_location.split())), 
@@ -76,20 +120,36 @@ if __name__ == '__main__':
         num_jobs = int(parse_num(num_jobs_txt, 0))
     except: 
         print('No jobs for search {} in {}'.format(job_title, job_location))
-        sys.exit(0)
+        return []
 
     current_date = str(datetime.datetime.now(pytz.timezone('US/Mountain')))
     storage_dct = {'job_site': 'ziprecruiter', 'num_jobs': num_jobs, 
             'date': current_date, 'title': job_title, 'location': job_location}
     store_in_mongo([storage_dct], 'job_numbers', 'ziprecruiter')
-    
+
     # Cycle through the pages of jobs to grab all of the info. that we want. Each
     # page holds 20 jobs, so the number of pages we'll cyle through will be
     # num_jobs / 20. The caveat, though is that they only give 20 pages to look
     # through at maximum (hence the min below). 
     pages = min(20, num_jobs // 20 + 1)
     page_positions = range(1, pages + 1)
-    execute_queries = partial(multiprocess_pages, query_URL,
-            job_title, job_location)
-    pool = multiprocessing.Pool(multiprocessing.cpu_count())
-    pool.map(execute_queries, page_positions)
+    return [(query_URL, job_title, job_location, page_num) for page_num in 
+            page_positions]
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['--retry-failed']: 
+        recrawl_dead_letters('ziprecruiter', multiprocess_pages, 
+                parse_posting_txt, gen_page_tasks=gen_page_tasks)
+        sys.exit(0)
+
+    if len(sys.argv) == 3 and sys.argv[1] == '--batch': 
+        searches = read_searches(sys.argv[2], num_fields=3)
+    else: 
+        try: 
+            searches = [(sys.argv[1], sys.argv[2], sys.argv[3])]
+        except IndexError: 
+            raise Exception('Program needs a job title, job location, and radius ' 
+                    '(or --batch and a CSV of them) inputted!')
+
+    # Every search (and page of results) shares one pool of workers. 
+    run_searches(searches, gen_page_tasks, multiprocess_pages, site='ziprecruiter')